@@ -145,6 +145,12 @@ install_python_deps() {
     cat > "$INSTALL_DIR/requirements.txt" << EOF
 # Базовые зависимости для NVIDIA Patcher
 # (включены в стандартную библиотеку Python)
+
+# Опциональные ускорители (при отсутствии используется stdlib)
+# blake3  - быстрые контрольные суммы бэкапов и драйверов
+# orjson  - быстрая сериализация JSON
+# nvidia-ml-py  - опрос GPU через NVML без запуска nvidia-smi
+# pyahocorasick  - поиск моделей карт в имени GPU за один проход
 EOF
     
     # Установка зависимостей (пока пусто, так как используем только stdlib)
@@ -4,42 +4,339 @@
 """
 
 import os
+import errno
+import bisect
 import shutil
 import json
+import hashlib
+import mmap
+import sqlite3
 import logging
 import datetime
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Dict, Optional, List
+from typing import Dict, Optional, List, Tuple
+
+from driver_detector import DriverDetector
+
+try:
+    import blake3
+except ImportError:  # опциональная зависимость
+    blake3 = None
+
+try:
+    import orjson
+except ImportError:  # опциональная зависимость
+    orjson = None
+
+# Алгоритм контрольных сумм для новых бэкапов; в индексе он хранится
+# для каждого файла, так что старые записи (sha256) остаются проверяемыми
+CHECKSUM_ALGO = 'blake3' if blake3 is not None else 'sha256'
+
+# Для файлов меньше этого размера накладные расходы mmap выше выигрыша
+MMAP_MIN_SIZE = 16 * 1024
+
+# Размер буфера для копирования в пространстве пользователя
+COPY_BUFSIZE = 1024 * 1024
+
+# Максимум потоков для параллельного копирования модулей
+MAX_COPY_WORKERS = 8
+
+# Схема индекса бэкапов; kind в backup_files - 'module' или 'config'
+INDEX_SCHEMA = """
+CREATE TABLE IF NOT EXISTS backups (
+    name TEXT PRIMARY KEY,
+    version TEXT NOT NULL,
+    timestamp TEXT NOT NULL,
+    created_at TEXT,
+    driver_info_json TEXT
+);
+CREATE INDEX IF NOT EXISTS backups_version_ts ON backups(version, timestamp);
+CREATE TABLE IF NOT EXISTS backup_files (
+    backup_name TEXT NOT NULL REFERENCES backups(name) ON DELETE CASCADE,
+    original TEXT NOT NULL,
+    backup TEXT NOT NULL,
+    size INTEGER,
+    checksum TEXT,
+    checksum_algo TEXT,
+    kind TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS backup_files_name ON backup_files(backup_name);
+"""
+
+
+def _json_dumps(obj) -> str:
+    """Сериализация JSON (orjson, если установлен)"""
+    if orjson is not None:
+        return orjson.dumps(obj).decode('utf-8')
+    return json.dumps(obj)
+
+
+def _json_loads(data):
+    """Разбор JSON из str или bytes (orjson, если установлен)"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+# Максимум байт за один вызов copy_file_range/sendfile
+KERNEL_COPY_BLOCK = 1 << 30
+
+# Ошибки, означающие, что копирование в ядре для этой пары файлов
+# не поддерживается; остальные (ENOSPC, EIO, ...) пробрасываются
+_KERNEL_COPY_UNSUPPORTED = frozenset({
+    errno.EINVAL, errno.ENOSYS, errno.EXDEV, errno.EOPNOTSUPP, errno.ENOTSUP,
+})
+
+
+def _kernel_copy(copy_fn, infd: int, outfd: int) -> bool:
+    """Копирование до конца файла через copy_fn(infd, outfd, count) -> байт
+    
+    Возвращает False, если ядро не поддерживает такое копирование.
+    """
+    try:
+        while copy_fn(infd, outfd, KERNEL_COPY_BLOCK):
+            pass
+        return True
+    except OSError as e:
+        if e.errno in _KERNEL_COPY_UNSUPPORTED:
+            return False
+        raise
+
+
+def _fast_copy(src, dst, buf: Optional[bytearray] = None):
+    """Копирование файла с метаданными (замена shutil.copy2)
+    
+    Сначала пробуем копирование в ядре: copy_file_range (CoW на btrfs/xfs),
+    затем sendfile; если оба недоступны - цикл readinto с буфером buf
+    (по умолчанию выделяется COPY_BUFSIZE).
+    """
+    with open(src, 'rb', buffering=0) as fsrc, open(dst, 'wb', buffering=0) as fdst:
+        infd, outfd = fsrc.fileno(), fdst.fileno()
+        copied = False
+        
+        if hasattr(os, 'copy_file_range'):
+            copied = _kernel_copy(os.copy_file_range, infd, outfd)
+        
+        if not copied and hasattr(os, 'sendfile'):
+            copied = _kernel_copy(
+                lambda i, o, count: os.sendfile(o, i, None, count), infd, outfd
+            )
+        
+        # Копирование продолжается с текущих смещений дескрипторов
+        if not copied:
+            if buf is None:
+                buf = bytearray(COPY_BUFSIZE)
+            mv = memoryview(buf)
+            while True:
+                n = fsrc.readinto(buf)
+                if not n:
+                    break
+                # Небуферизованная запись может быть частичной
+                chunk = mv[:n]
+                while chunk:
+                    chunk = chunk[fdst.write(chunk):]
+    
+    shutil.copystat(src, dst)
+
+
+def _new_hasher(algo: str = CHECKSUM_ALGO):
+    """Создание объекта хеширования для указанного алгоритма"""
+    if algo == 'blake3':
+        return blake3.blake3(max_threads=blake3.blake3.AUTO)
+    return hashlib.new(algo)
+
+
+def _copy_and_hash(src, dst, algo: str = CHECKSUM_ALGO, buf: Optional[bytearray] = None):
+    """Копирование файла с одновременным подсчетом контрольной суммы
+    
+    Файл читается один раз: каждый блок передается и в хеш, и в dst.
+    buf - переиспользуемый буфер чтения. Возвращает (размер, контрольная сумма).
+    """
+    hasher = _new_hasher(algo)
+    size = 0
+    if buf is None:
+        buf = bytearray(COPY_BUFSIZE)
+    mv = memoryview(buf)
+    
+    with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+        while True:
+            n = fsrc.readinto(buf)
+            if not n:
+                break
+            chunk = mv[:n]
+            hasher.update(chunk)
+            fdst.write(chunk)
+            size += n
+    
+    shutil.copystat(src, dst)
+    return size, hasher.hexdigest()
+
 
 class BackupManager:
     """Класс для управления резервными копиями"""
     
-    def __init__(self, backup_dir: str = "/var/lib/nvidia-patcher/backups"):
+    def __init__(self, backup_dir: str = "/var/lib/nvidia-patcher/backups",
+                 detector: Optional[DriverDetector] = None):
         self.logger = logging.getLogger(__name__)
         self.backup_dir = Path(backup_dir)
         self.backup_dir.mkdir(parents=True, exist_ok=True)
-        self.backup_index = self.backup_dir / "backup_index.json"
+        self.backup_index = self.backup_dir / "index.db"
+        # JSON-индекс старых версий, импортируется в SQLite при первом запуске
+        self.legacy_index = self.backup_dir / "backup_index.json"
+        # Детектор можно передать общий с вызывающим кодом, чтобы кеши не дублировались
+        self._detector = detector
+        # Буферы копирования: по одному на поток пула, общие для всех файлов
+        self._scratch = threading.local()
         self.load_backup_index()
     
+    def _scratch_buffer(self) -> bytearray:
+        """Буфер копирования текущего потока"""
+        buf = getattr(self._scratch, 'buf', None)
+        if buf is None:
+            buf = self._scratch.buf = bytearray(COPY_BUFSIZE)
+        return buf
+    
+    @property
+    def detector(self) -> DriverDetector:
+        """Детектор драйверов, создается при первом обращении
+        
+        Один экземпляр на менеджер, чтобы кеш путей модулей переиспользовался.
+        """
+        if self._detector is None:
+            self._detector = DriverDetector()
+        return self._detector
+    
     def load_backup_index(self):
-        """Загрузка индекса бэкапов"""
+        """Открытие индекса бэкапов"""
+        self._db = None
         try:
-            if self.backup_index.exists():
-                with open(self.backup_index, 'r') as f:
-                    self.backup_data = json.load(f)
-            else:
-                self.backup_data = {}
+            self._db = self._open_index(str(self.backup_index))
+            self._build_version_index()
         except Exception as e:
+            # Базу на диске открыть не удалось - работаем с индексом в памяти
             self.logger.error(f"Ошибка загрузки индекса бэкапов: {e}")
-            self.backup_data = {}
-    
-    def save_backup_index(self):
-        """Сохранение индекса бэкапов"""
+            if self._db is not None:
+                self._db.close()
+            self._db = self._open_index(":memory:")
+            self._build_version_index()
+        
+        # Ошибка переноса старого индекса не отменяет базу на диске;
+        # JSON остается на месте, перенос повторится при следующем запуске
         try:
-            with open(self.backup_index, 'w') as f:
-                json.dump(self.backup_data, f, indent=2)
+            self._migrate_legacy_index()
         except Exception as e:
-            self.logger.error(f"Ошибка сохранения индекса бэкапов: {e}")
+            self.logger.error(f"Ошибка переноса индекса {self.legacy_index}: {e}")
+    
+    def _build_version_index(self):
+        """Построение индекса версия -> [(timestamp, name)] по возрастанию времени"""
+        self._by_version: Dict[str, List[Tuple[str, str]]] = {}
+        for version, timestamp, backup_name in self._db.execute(
+            "SELECT version, timestamp, name FROM backups WHERE timestamp != '' "
+            "ORDER BY timestamp"
+        ):
+            self._by_version.setdefault(version, []).append((timestamp, backup_name))
+    
+    def _open_index(self, database: str) -> sqlite3.Connection:
+        """Подключение к базе индекса и создание схемы"""
+        db = sqlite3.connect(database, isolation_level=None)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA foreign_keys=ON")
+        db.executescript(INDEX_SCHEMA)
+        return db
+    
+    def _migrate_legacy_index(self):
+        """Импорт backup_index.json в SQLite"""
+        if not self.legacy_index.exists():
+            return
+        
+        legacy_data = _json_loads(self.legacy_index.read_bytes())
+        
+        for backup_name, backup_info in legacy_data.items():
+            self._insert_backup(backup_name, backup_info)
+        
+        self.legacy_index.rename(self.legacy_index.with_suffix('.json.migrated'))
+        self.logger.info(f"Индекс бэкапов перенесен в {self.backup_index}: {len(legacy_data)} записей")
+    
+    def _insert_backup(self, backup_name: str, backup_info: Dict):
+        """Запись бэкапа в индекс одной транзакцией"""
+        rows = [
+            (backup_name, f['original'], f['backup'], f.get('size'), f.get('checksum'),
+             f.get('checksum_algo', 'sha256'), 'module')
+            for f in backup_info.get('files', [])
+        ]
+        rows.extend(
+            (backup_name, c['original'], c['backup'], None, None, None, 'config')
+            for c in backup_info.get('config_files', [])
+        )
+        
+        db = self._db
+        db.execute("BEGIN")
+        try:
+            db.execute("DELETE FROM backup_files WHERE backup_name = ?", (backup_name,))
+            db.execute(
+                "INSERT OR REPLACE INTO backups (name, version, timestamp, created_at, driver_info_json) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (backup_name, backup_info['version'], backup_info.get('timestamp', ''),
+                 backup_info.get('created_at'), _json_dumps(backup_info.get('driver_info', {})))
+            )
+            db.executemany(
+                "INSERT INTO backup_files (backup_name, original, backup, size, checksum, checksum_algo, kind) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                rows
+            )
+            db.execute("COMMIT")
+        except Exception:
+            db.execute("ROLLBACK")
+            raise
+        
+        timestamp = backup_info.get('timestamp', '')
+        if timestamp:
+            entries = self._by_version.setdefault(backup_info['version'], [])
+            entry = (timestamp, backup_name)
+            if entry not in entries:
+                bisect.insort(entries, entry)
+    
+    def _load_backup(self, backup_name: str) -> Optional[Dict]:
+        """Чтение записи бэкапа из индекса"""
+        row = self._db.execute(
+            "SELECT version, timestamp, created_at, driver_info_json FROM backups WHERE name = ?",
+            (backup_name,)
+        ).fetchone()
+        if row is None:
+            return None
+        
+        version, timestamp, created_at, driver_info_json = row
+        backup_info = {
+            'version': version,
+            'timestamp': timestamp,
+            'files': [],
+            'config_files': [],
+            'driver_info': _json_loads(driver_info_json) if driver_info_json else {},
+            'created_at': created_at
+        }
+        
+        for original, backup, size, checksum, checksum_algo, kind in self._db.execute(
+            "SELECT original, backup, size, checksum, checksum_algo, kind "
+            "FROM backup_files WHERE backup_name = ? ORDER BY rowid",
+            (backup_name,)
+        ):
+            if kind == 'module':
+                backup_info['files'].append({
+                    'original': original,
+                    'backup': backup,
+                    'size': size,
+                    'checksum': checksum,
+                    'checksum_algo': checksum_algo
+                })
+            else:
+                backup_info['config_files'].append({
+                    'original': original,
+                    'backup': backup
+                })
+        
+        return backup_info
     
     def create_backup(self, driver_info: Dict) -> Optional[str]:
         """Создание резервной копии драйвера"""
@@ -53,50 +350,40 @@ class BackupManager:
             self.logger.info(f"Создание бэкапа в: {backup_path}")
             
             # Копирование файлов драйвера
-            from driver_detector import DriverDetector
-            detector = DriverDetector()
-            module_paths = detector.get_nvidia_module_paths(driver_info)
+            module_paths = self.detector.get_nvidia_module_paths(driver_info)
             
-            backed_up_files = []
-            success_count = 0
+            # Модули с одинаковым именем (например, updates/dkms/ и kernel/)
+            # получают в бэкапе префикс с номером; исходный путь хранится в индексе
+            jobs = {}
+            for module_path in dict.fromkeys(module_paths):
+                name = os.path.basename(module_path)
+                backup_file = backup_path / name
+                copy_index = 0
+                while backup_file in jobs:
+                    copy_index += 1
+                    backup_file = backup_path / f"{copy_index}_{name}"
+                jobs[backup_file] = module_path
             
-            for module_path in module_paths:
-                try:
-                    if os.path.exists(module_path):
-                        filename = os.path.basename(module_path)
-                        backup_file = backup_path / filename
-                        
-                        # Копирование файла
-                        shutil.copy2(module_path, backup_file)
-                        
-                        # Сохранение информации о файле
-                        backed_up_files.append({
-                            'original': module_path,
-                            'backup': str(backup_file),
-                            'size': os.path.getsize(module_path),
-                            'checksum': self._calculate_checksum(module_path)
-                        })
-                        
-                        success_count += 1
-                        self.logger.info(f"Скопирован: {module_path}")
-                    
-                except Exception as e:
-                    self.logger.error(f"Ошибка копирования {module_path}: {e}")
+            backed_up_files = []
+            if jobs:
+                workers = min(MAX_COPY_WORKERS, len(jobs))
+                with ThreadPoolExecutor(max_workers=workers) as executor:
+                    results = executor.map(self._backup_module, jobs.values(), jobs.keys())
+                    backed_up_files = [info for info in results if info]
+            success_count = len(backed_up_files)
             
             # Сохранение конфигурационных файлов
             config_files = self._backup_config_files(backup_path)
             
             # Обновление индекса
-            self.backup_data[backup_name] = {
+            self._insert_backup(backup_name, {
                 'version': version,
                 'timestamp': timestamp,
                 'files': backed_up_files,
                 'config_files': config_files,
                 'driver_info': driver_info,
                 'created_at': datetime.datetime.now().isoformat()
-            }
-            
-            self.save_backup_index()
+            })
             
             if success_count > 0:
                 self.logger.info(f"Бэкап успешно создан: {backup_name}")
@@ -109,6 +396,32 @@ class BackupManager:
             self.logger.error(f"Ошибка создания бэкапа: {e}")
             return None
     
+    def _backup_module(self, module_path: str, backup_file: Path) -> Optional[Dict]:
+        """Копирование одного модуля в бэкап (выполняется в пуле потоков)"""
+        try:
+            # Копирование файла с подсчетом контрольной суммы
+            size, checksum = _copy_and_hash(module_path, backup_file,
+                                            buf=self._scratch_buffer())
+            self.logger.info(f"Скопирован: {module_path}")
+            
+            # Сохранение информации о файле
+            return {
+                'original': module_path,
+                'backup': str(backup_file),
+                'size': size,
+                'checksum': checksum,
+                'checksum_algo': CHECKSUM_ALGO
+            }
+            
+        except FileNotFoundError as e:
+            # Отсутствующий модуль просто пропускается
+            if e.filename != module_path:
+                self.logger.error(f"Ошибка копирования {module_path}: {e}")
+        except Exception as e:
+            self.logger.error(f"Ошибка копирования {module_path}: {e}")
+        
+        return None
+    
     def _backup_config_files(self, backup_path: Path) -> List[str]:
         """Резервное копирование конфигурационных файлов"""
         config_files = []
@@ -124,18 +437,21 @@ class BackupManager:
         config_backup_dir.mkdir(exist_ok=True)
         
         for config_path in config_paths:
-            if os.path.exists(config_path):
-                try:
-                    filename = os.path.basename(config_path)
-                    backup_config = config_backup_dir / filename
-                    shutil.copy2(config_path, backup_config)
-                    config_files.append({
-                        'original': config_path,
-                        'backup': str(backup_config)
-                    })
-                    self.logger.info(f"Скопирован конфиг: {config_path}")
-                except Exception as e:
+            try:
+                filename = os.path.basename(config_path)
+                backup_config = config_backup_dir / filename
+                _fast_copy(config_path, backup_config, self._scratch_buffer())
+                config_files.append({
+                    'original': config_path,
+                    'backup': str(backup_config)
+                })
+                self.logger.info(f"Скопирован конфиг: {config_path}")
+            except FileNotFoundError as e:
+                # Конфиг не установлен в системе
+                if e.filename != config_path:
                     self.logger.error(f"Ошибка копирования конфига {config_path}: {e}")
+            except Exception as e:
+                self.logger.error(f"Ошибка копирования конфига {config_path}: {e}")
         
         return config_files
     
@@ -151,43 +467,30 @@ class BackupManager:
                 self.logger.error(f"Бэкап для версии {version} не найден")
                 return False
             
-            backup_info = self.backup_data[latest_backup]
+            backup_info = self._load_backup(latest_backup)
             backup_path = self.backup_dir / latest_backup
             
             self.logger.info(f"Восстановление из бэкапа: {backup_path}")
             
             # Восстановление файлов
+            files = backup_info['files']
             success_count = 0
-            for file_info in backup_info['files']:
-                original_path = file_info['original']
-                backup_path_file = file_info['backup']
-                
-                try:
-                    if os.path.exists(backup_path_file):
-                        # Проверка контрольной суммы
-                        current_checksum = self._calculate_checksum(backup_path_file)
-                        if current_checksum == file_info['checksum']:
-                            shutil.copy2(backup_path_file, original_path)
-                            success_count += 1
-                            self.logger.info(f"Восстановлен: {original_path}")
-                        else:
-                            self.logger.warning(f"Несовпадение контрольной суммы: {original_path}")
-                    else:
-                        self.logger.warning(f"Файл бэкапа не найден: {backup_path_file}")
-                        
-                except Exception as e:
-                    self.logger.error(f"Ошибка восстановления {original_path}: {e}")
+            if files:
+                workers = min(MAX_COPY_WORKERS, len(files))
+                with ThreadPoolExecutor(max_workers=workers) as executor:
+                    success_count = sum(executor.map(self._restore_file, files))
             
             # Восстановление конфигурационных файлов
             for config_info in backup_info.get('config_files', []):
+                original_config = config_info['original']
+                backup_config = config_info['backup']
+                
                 try:
-                    original_config = config_info['original']
-                    backup_config = config_info['backup']
-                    
-                    if os.path.exists(backup_config):
-                        shutil.copy2(backup_config, original_config)
-                        self.logger.info(f"Восстановлен конфиг: {original_config}")
-                        
+                    _fast_copy(backup_config, original_config, self._scratch_buffer())
+                    self.logger.info(f"Восстановлен конфиг: {original_config}")
+                except FileNotFoundError as e:
+                    if e.filename != backup_config:
+                        self.logger.error(f"Ошибка восстановления конфига: {e}")
                 except Exception as e:
                     self.logger.error(f"Ошибка восстановления конфига: {e}")
             
@@ -202,40 +505,65 @@ class BackupManager:
             self.logger.error(f"Ошибка восстановления бэкапа: {e}")
             return False
     
-    def _find_latest_backup(self, version: str) -> Optional[str]:
-        """Поиск последнего бэкапа для указанной версии"""
-        latest_backup = None
-        latest_timestamp = None
+    def _restore_file(self, file_info: Dict) -> bool:
+        """Восстановление одного файла из бэкапа (выполняется в пуле потоков)"""
+        original_path = file_info['original']
+        backup_path_file = file_info['backup']
         
-        for backup_name, backup_info in self.backup_data.items():
-            if backup_info['version'] == version:
-                timestamp = backup_info.get('timestamp', '')
-                if timestamp and (latest_timestamp is None or timestamp > latest_timestamp):
-                    latest_backup = backup_name
-                    latest_timestamp = timestamp
+        try:
+            # Проверка контрольной суммы
+            # Записи без тега созданы до перехода на BLAKE3
+            algo = file_info.get('checksum_algo', 'sha256')
+            current_checksum = self._calculate_checksum(backup_path_file, algo)
+            if current_checksum == file_info['checksum']:
+                _fast_copy(backup_path_file, original_path, self._scratch_buffer())
+                self.logger.info(f"Восстановлен: {original_path}")
+                return True
+            else:
+                self.logger.warning(f"Несовпадение контрольной суммы: {original_path}")
+                
+        except FileNotFoundError as e:
+            if e.filename == backup_path_file:
+                self.logger.warning(f"Файл бэкапа не найден: {backup_path_file}")
+            else:
+                self.logger.error(f"Ошибка восстановления {original_path}: {e}")
+        except Exception as e:
+            self.logger.error(f"Ошибка восстановления {original_path}: {e}")
         
-        return latest_backup
+        return False
+    
+    def _find_latest_backup(self, version: str) -> Optional[str]:
+        """Поиск последнего бэкапа для указанной версии"""
+        entries = self._by_version.get(version)
+        return entries[-1][1] if entries else None
     
     def list_backups(self) -> List[Dict]:
         """Список доступных бэкапов"""
         backups = []
         
-        for backup_name, backup_info in self.backup_data.items():
+        for backup_name, version, timestamp, created_at, files_count in self._db.execute(
+            "SELECT b.name, b.version, b.timestamp, b.created_at, "
+            "(SELECT COUNT(*) FROM backup_files f WHERE f.backup_name = b.name AND f.kind = 'module') "
+            "FROM backups b ORDER BY b.timestamp DESC"
+        ):
             backups.append({
                 'name': backup_name,
-                'version': backup_info['version'],
-                'timestamp': backup_info['timestamp'],
-                'created_at': backup_info.get('created_at'),
-                'files_count': len(backup_info.get('files', [])),
+                'version': version,
+                'timestamp': timestamp,
+                'created_at': created_at,
+                'files_count': files_count,
                 'path': str(self.backup_dir / backup_name)
             })
         
-        return sorted(backups, key=lambda x: x['timestamp'], reverse=True)
+        return backups
     
     def delete_backup(self, backup_name: str) -> bool:
         """Удаление бэкапа"""
         try:
-            if backup_name not in self.backup_data:
+            row = self._db.execute(
+                "SELECT version, timestamp FROM backups WHERE name = ?", (backup_name,)
+            ).fetchone()
+            if not row:
                 self.logger.error(f"Бэкап {backup_name} не найден")
                 return False
             
@@ -245,9 +573,15 @@ class BackupManager:
             if backup_path.exists():
                 shutil.rmtree(backup_path)
             
-            # Удаление из индекса
-            del self.backup_data[backup_name]
-            self.save_backup_index()
+            # Удаление из индекса (файлы удаляются каскадно)
+            self._db.execute("DELETE FROM backups WHERE name = ?", (backup_name,))
+            
+            version, timestamp = row
+            entries = self._by_version.get(version, [])
+            if (timestamp, backup_name) in entries:
+                entries.remove((timestamp, backup_name))
+            if not entries:
+                self._by_version.pop(version, None)
             
             self.logger.info(f"Бэкап {backup_name} удален")
             return True
@@ -279,18 +613,42 @@ class BackupManager:
             self.logger.error(f"Ошибка очистки бэкапов: {e}")
             return 0
     
-    def _calculate_checksum(self, file_path: str) -> str:
-        """Вычисление контрольной суммы файла"""
+    def _calculate_checksum(self, file_path: str, algo: str = CHECKSUM_ALGO) -> str:
+        """Вычисление контрольной суммы файла
+        
+        Файл читается всегда: проверка целостности перед восстановлением
+        должна видеть порчу содержимого и без смены mtime и размера.
+        """
         try:
-            import hashlib
-            hash_sha256 = hashlib.sha256()
-            
-            with open(file_path, "rb") as f:
-                for chunk in iter(lambda: f.read(4096), b""):
-                    hash_sha256.update(chunk)
-            
-            return hash_sha256.hexdigest()
+            return self._hash_file(file_path, algo)
             
+        except FileNotFoundError:
+            # Отсутствие файла обрабатывает вызывающий код
+            raise
         except Exception as e:
             self.logger.error(f"Ошибка вычисления контрольной суммы {file_path}: {e}")
-            return ""
\ No newline at end of file
+            return ""
+    
+    def _hash_file(self, file_path: str, algo: str) -> str:
+        """Чтение файла и подсчет контрольной суммы"""
+        if algo == 'blake3':
+            if blake3 is None:
+                self.logger.error(f"Модуль blake3 недоступен, проверка {file_path} невозможна")
+                return ""
+            hasher = blake3.blake3(max_threads=blake3.blake3.AUTO)
+            hasher.update_mmap(file_path)
+            return hasher.hexdigest()
+        
+        hash_sha256 = hashlib.sha256()
+        
+        with open(file_path, "rb") as f:
+            if os.fstat(f.fileno()).st_size < MMAP_MIN_SIZE:
+                hash_sha256.update(f.read())
+            else:
+                with mmap.mmap(f.fileno(), 0, prot=mmap.PROT_READ) as mm:
+                    if hasattr(mm, 'madvise'):
+                        mm.madvise(mmap.MADV_SEQUENTIAL)
+                    with memoryview(mm) as mv:
+                        hash_sha256.update(mv)
+        
+        return hash_sha256.hexdigest()
\ No newline at end of file
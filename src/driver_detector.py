@@ -5,10 +5,40 @@
 
 import os
 import re
+import shutil
 import subprocess
+import time
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Tuple
+
+# Полная версия драйвера, например 535.274.02.0
+_VERSION_RE = re.compile(r'(\d+\.\d+\.\d+\.\d+)')
+# Номер ветки драйвера в имени пакета apt/rpm
+_APT_RE = re.compile(r'nvidia-driver-(\d+)')
+# Поле version в выводе modinfo
+_MODINFO_VER_RE = re.compile(r'^version:\s*(\S+)', re.M)
+# Версия в /proc/driver/nvidia/version: "... Kernel Module  535.274.02  ..."
+# или для открытых модулей "... Open Kernel Module for x86_64  535.274.02  ..."
+_PROC_VER_RE = re.compile(r'Kernel Module(?: for \S+)?\s+(\d+(?:\.\d+)+)')
+
+# Версия загруженного модуля ядра, доступна без запуска nvidia-smi
+PROC_VERSION_FILE = '/proc/driver/nvidia/version'
+
+# Версия ядра не меняется за время жизни процесса
+_KERNEL_RELEASE = os.uname().release
+
+# Каталоги /lib/modules/<release>, в которых не бывает собранных модулей
+_PRUNED_MODULE_DIRS = frozenset({'source', 'build', '.git'})
+
+# Подкаталоги /lib/modules/<release> в порядке приоритета depmod
+# ("search updates extra built-in"): копия модуля из DKMS в updates/ или
+# extra/ загружается modprobe вместо одноименной копии из kernel/
+_MODULE_SEARCH_ORDER = ('updates', 'extra')
+
+# Время жизни кеша результата detect_nvidia_drivers, секунд
+DRIVERS_CACHE_TTL = 30.0
 
 class DriverDetector:
     """Класс для обнаружения драйверов NVIDIA"""
@@ -22,49 +52,78 @@ class DriverDetector:
             '/lib64/',
             '/opt/nvidia/',
         ]
-        self.nvidia_modules = [
+        self.nvidia_modules = frozenset({
             'nvidia.ko',
             'nvidia-drm.ko', 
             'nvidia-modeset.ko',
             'nvidia-uvm.ko'
-        ]
+        })
+        # Кеш путей модулей: (версия ядра, версия драйвера) -> пути
+        self._module_path_cache: Dict[Tuple[str, str], List[str]] = {}
+        # Кеш результата detect_nvidia_drivers и время его заполнения
+        self._drivers_cache: Optional[List[Dict]] = None
+        self._drivers_cache_ts = 0.0
     
-    def detect_nvidia_drivers(self) -> List[Dict]:
-        """Обнаружение установленных драйверов NVIDIA"""
-        drivers = []
+    def detect_nvidia_drivers(self, refresh: bool = False) -> List[Dict]:
+        """Обнаружение установленных драйверов NVIDIA
         
-        # Способ 1: через nvidia-smi
-        smi_info = self._get_nvidia_smi_info()
-        if smi_info:
-            drivers.append(smi_info)
+        Результат кешируется на DRIVERS_CACHE_TTL секунд, чтобы повторные
+        вызовы за один запуск не запускали подпроцессы заново; refresh=True
+        выполняет поиск заново.
+        """
+        now = time.monotonic()
+        if (not refresh and self._drivers_cache is not None
+                and now - self._drivers_cache_ts < DRIVERS_CACHE_TTL):
+            return [dict(d) for d in self._drivers_cache]
         
-        # Способ 2: через модули ядра
-        module_info = self._get_kernel_module_info()
-        if module_info and not any(d['version'] == module_info['version'] for d in drivers):
-            drivers.append(module_info)
+        # Способы в порядке приоритета: nvidia-smi, модули ядра,
+        # файлы библиотек, пакетный менеджер
+        probes = (
+            self._get_nvidia_smi_info,
+            self._get_kernel_module_info,
+            self._get_library_info,
+            self._get_package_info,
+        )
         
-        # Способ 3: через файлы библиотек
-        lib_info = self._get_library_info()
-        if lib_info and not any(d['version'] == lib_info['version'] for d in drivers):
-            drivers.append(lib_info)
+        # Пробы независимы и в основном ждут подпроцессы - запускаем параллельно
+        with ThreadPoolExecutor(max_workers=len(probes)) as executor:
+            results = list(executor.map(lambda probe: probe(), probes))
         
-        # Способ 4: через пакетный менеджер
-        pkg_info = self._get_package_info()
-        if pkg_info and not any(d['version'] == pkg_info['version'] for d in drivers):
-            drivers.append(pkg_info)
+        drivers = []
+        for info in results:
+            if info and not any(d['version'] == info['version'] for d in drivers):
+                drivers.append(info)
         
-        return drivers
+        self._drivers_cache = drivers
+        self._drivers_cache_ts = now
+        return [dict(d) for d in drivers]
     
     def _get_nvidia_smi_info(self) -> Optional[Dict]:
         """Получение информации через nvidia-smi"""
+        # Если модуль загружен, версию можно прочитать из procfs без fork/exec
+        try:
+            proc_match = _PROC_VER_RE.search(Path(PROC_VERSION_FILE).read_text())
+            if proc_match:
+                version = proc_match.group(1)
+                self.logger.info(f"Драйвер найден через {PROC_VERSION_FILE}: {version}")
+                return {
+                    'version': version,
+                    'source': 'procfs',
+                    'path': self._find_nvidia_path(version)
+                }
+        except OSError as e:
+            self.logger.debug(f"{PROC_VERSION_FILE} недоступен: {e}")
+        
         try:
             result = subprocess.run(
                 ['nvidia-smi', '--query-gpu=driver_version', '--format=csv,noheader'],
-                capture_output=True, text=True, timeout=10
+                capture_output=True, timeout=10
             )
             
             if result.returncode == 0:
-                version = result.stdout.strip()
+                # По строке на GPU, версия драйвера у всех одна
+                lines = result.stdout.strip().decode('ascii', 'replace').splitlines()
+                version = lines[0].strip() if lines else ''
                 if version:
                     self.logger.info(f"Драйвер найден через nvidia-smi: {version}")
                     return {
@@ -87,15 +146,11 @@ class DriverDetector:
             )
             
             if result.returncode == 0:
-                version = None
-                for line in result.stdout.split('\n'):
-                    if line.startswith('version:'):
-                        version = line.split(':')[1].strip()
-                        break
+                modinfo_match = _MODINFO_VER_RE.search(result.stdout)
                 
-                if version:
+                if modinfo_match:
                     # Извлечение версии из строки (может содержать доп. информацию)
-                    version_match = re.search(r'(\d+\.\d+\.\d+\.\d+)', version)
+                    version_match = _VERSION_RE.search(modinfo_match.group(1))
                     if version_match:
                         clean_version = version_match.group(1)
                         self.logger.info(f"Драйвер найден через модуль ядра: {clean_version}")
@@ -114,17 +169,9 @@ class DriverDetector:
         try:
             # Поиск libnvidia-ml.so
             for base_path in self.common_paths:
-                lib_pattern = os.path.join(base_path, 'libnvidia-ml.so.*')
-                result = subprocess.run(
-                    ['bash', '-c', f'ls -la {lib_pattern} 2>/dev/null | head -1'],
-                    capture_output=True, text=True, timeout=10
-                )
-                
-                if result.returncode == 0 and result.stdout.strip():
-                    lib_path = result.stdout.strip().split()[-1]
-                    
+                for lib in sorted(Path(base_path).glob('libnvidia-ml.so.*')):
                     # Извлечение версии из имени файла
-                    version_match = re.search(r'(\d+\.\d+\.\d+\.\d+)', lib_path)
+                    version_match = _VERSION_RE.search(lib.name)
                     if version_match:
                         version = version_match.group(1)
                         self.logger.info(f"Драйвер найден через библиотеку: {version}")
@@ -132,7 +179,7 @@ class DriverDetector:
                             'version': version,
                             'source': 'library',
                             'path': self._find_nvidia_path(version),
-                            'library_path': lib_path
+                            'library_path': str(lib)
                         }
         except Exception as e:
             self.logger.debug(f"Ошибка поиска библиотек: {e}")
@@ -150,9 +197,9 @@ class DriverDetector:
                 )
                 
                 if result.returncode == 0:
-                    for line in result.stdout.split('\n'):
+                    for line in result.stdout.splitlines():
                         if 'nvidia-driver' in line and '[installed]' in line:
-                            version_match = re.search(r'nvidia-driver-(\d+)', line)
+                            version_match = _APT_RE.search(line)
                             if version_match:
                                 version = version_match.group(1) + '.274.02'  # Предполагаем версию
                                 self.logger.info(f"Драйвер найден через apt: {version}")
@@ -170,17 +217,18 @@ class DriverDetector:
                 )
                 
                 if result.returncode == 0:
-                    for line in result.stdout.split('\n'):
-                        if line.strip():
-                            version_match = re.search(r'nvidia-driver-(\d+)', line)
-                            if version_match:
-                                version = version_match.group(1) + '.274.02'
-                                self.logger.info(f"Драйвер найден через rpm: {version}")
-                                return {
-                                    'version': version,
-                                    'source': 'rpm-package',
-                                    'path': self._find_nvidia_path(version)
-                                }
+                    for line in result.stdout.splitlines():
+                        if not line:
+                            continue
+                        version_match = _APT_RE.search(line)
+                        if version_match:
+                            version = version_match.group(1) + '.274.02'
+                            self.logger.info(f"Драйвер найден через rpm: {version}")
+                            return {
+                                'version': version,
+                                'source': 'rpm-package',
+                                'path': self._find_nvidia_path(version)
+                            }
         
         except Exception as e:
             self.logger.debug(f"Ошибка поиска пакетов: {e}")
@@ -207,54 +255,121 @@ class DriverDetector:
         
         return None
     
-    def get_nvidia_module_paths(self, driver_info: Dict) -> List[str]:
-        """Получение путей к модулям NVIDIA"""
-        paths = []
+    def get_nvidia_module_paths(self, driver_info: Dict, refresh: bool = False) -> List[str]:
+        """Получение путей к модулям NVIDIA
+        
+        Результат кешируется по версии ядра и драйвера; refresh=True
+        выполняет поиск заново.
+        """
         version = driver_info['version']
+        cache_key = (_KERNEL_RELEASE, version)
+        
+        if not refresh and cache_key in self._module_path_cache:
+            return list(self._module_path_cache[cache_key])
+        
+        paths = []
         
         # Поиск в /lib/modules
-        kernel_release = os.uname().release
-        module_base = f'/lib/modules/{kernel_release}/'
+        module_base = f'/lib/modules/{_KERNEL_RELEASE}/'
         
         if os.path.exists(module_base):
-            for root, dirs, files in os.walk(module_base):
-                for file in files:
-                    if file in self.nvidia_modules:
-                        paths.append(os.path.join(root, file))
+            paths.extend(self._iter_nvidia_ko(module_base))
         
         # Поиск в standard locations
         for base_path in self.common_paths:
             nvidia_path = os.path.join(base_path, f'nvidia-{version}/')
             if os.path.exists(nvidia_path):
-                for file in self.nvidia_modules:
+                # sorted: порядок обхода frozenset зависит от хеш-сида
+                for file in sorted(self.nvidia_modules):
                     full_path = os.path.join(nvidia_path, file)
                     if os.path.exists(full_path):
                         paths.append(full_path)
         
-        # Дедупликация
-        paths = list(set(paths))
+        # Дедупликация с сохранением порядка обнаружения
+        paths = list(dict.fromkeys(paths))
         self.logger.info(f"Найдено модулей NVIDIA: {len(paths)}")
         
-        return paths
+        self._module_path_cache[cache_key] = paths
+        return list(paths)
+    
+    def _iter_nvidia_ko(self, root: str):
+        """Ограниченный поиск модулей NVIDIA под root
+        
+        Для каждого имени из nvidia_modules возвращается одна копия - та,
+        которую выберет modprobe: сначала обходятся подкаталоги из
+        _MODULE_SEARCH_ORDER, затем остальное дерево. Внутри каталога записи
+        перебираются по имени, так что результат не зависит от порядка
+        scandir. Каталоги из _PRUNED_MODULE_DIRS пропускаются, обход
+        завершается, как только найдены все имена.
+        """
+        remaining = set(self.nvidia_modules)
+        priority_dirs = [os.path.join(root, name) for name in _MODULE_SEARCH_ORDER]
+        
+        for top in priority_dirs + [root]:
+            stack = [top]
+            while stack:
+                path = stack.pop()
+                try:
+                    with os.scandir(path) as it:
+                        entries = sorted(it, key=lambda entry: entry.name)
+                except OSError as e:
+                    self.logger.debug(f"Ошибка чтения {path}: {e}")
+                    continue
+                
+                subdirs = []
+                for entry in entries:
+                    try:
+                        is_dir = entry.is_dir(follow_symlinks=False)
+                    except OSError:
+                        continue
+                    if is_dir:
+                        if entry.name in _PRUNED_MODULE_DIRS:
+                            continue
+                        # Приоритетные каталоги уже обойдены до корня
+                        if top == root and path == root and entry.name in _MODULE_SEARCH_ORDER:
+                            continue
+                        subdirs.append(entry.path)
+                    elif entry.name in remaining:
+                        remaining.discard(entry.name)
+                        yield entry.path
+                        if not remaining:
+                            return
+                
+                # Обратный порядок на стеке - обход подкаталогов по имени
+                stack.extend(reversed(subdirs))
     
     def verify_module_integrity(self, module_path: str) -> bool:
         """Проверка целостности модуля"""
         try:
-            if not os.path.exists(module_path):
-                return False
-            
+            st = os.stat(module_path)
+        except FileNotFoundError:
+            return False
+        except Exception as e:
+            self.logger.error(f"Ошибка проверки целостности {module_path}: {e}")
+            return False
+        
+        return self._check_module_integrity(module_path, st)
+    
+    def _check_module_integrity(self, module_path: str, st: os.stat_result) -> bool:
+        """Проверка целостности модуля по уже полученному stat"""
+        try:
             # Проверка размера файла
-            file_size = os.path.getsize(module_path)
-            if file_size < 1024:  # Минимальный разумный размер
+            if st.st_size < 1024:  # Минимальный разумный размер
                 return False
             
-            # Проверка сигнатуры ELF
-            with open(module_path, 'rb') as f:
-                magic = f.read(4)
-                if magic != b'\x7fELF':
-                    return False
+            # Проверка сигнатуры ELF: один pread без буферизации и обновления atime
+            flags = os.O_RDONLY | getattr(os, 'O_NOATIME', 0) | getattr(os, 'O_CLOEXEC', 0)
+            try:
+                fd = os.open(module_path, flags)
+            except PermissionError:
+                # O_NOATIME разрешен только владельцу файла
+                fd = os.open(module_path, os.O_RDONLY | getattr(os, 'O_CLOEXEC', 0))
+            try:
+                magic = os.pread(fd, 4, 0)
+            finally:
+                os.close(fd)
             
-            return True
+            return magic == b'\x7fELF'
             
         except Exception as e:
             self.logger.error(f"Ошибка проверки целостности {module_path}: {e}")
@@ -264,18 +379,22 @@ class DriverDetector:
         """Получение подробной информации о драйвере"""
         info = {
             'path': driver_path,
-            'exists': os.path.exists(driver_path),
+            'exists': False,
             'size': 0,
             'modified': None,
             'permissions': None,
             'integrity': False
         }
         
-        if info['exists']:
+        try:
             stat = os.stat(driver_path)
-            info['size'] = stat.st_size
-            info['modified'] = stat.st_mtime
-            info['permissions'] = oct(stat.st_mode)[-3:]
-            info['integrity'] = self.verify_module_integrity(driver_path)
+        except OSError:
+            return info
+        
+        info['exists'] = True
+        info['size'] = stat.st_size
+        info['modified'] = stat.st_mtime
+        info['permissions'] = oct(stat.st_mode)[-3:]
+        info['integrity'] = self._check_module_integrity(driver_path, stat)
         
         return info
\ No newline at end of file
@@ -6,257 +6,586 @@ P106-100, P104-100, P102, P106-090 и других
 
 import os
 import re
+import time
+import select
+import shutil
+import signal
 import subprocess
+import sys
+import threading
 import logging
-from pathlib import Path
-from typing import List, Dict, Optional
+from concurrent.futures import ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from typing import List, Dict, Optional, Tuple
 import json
+import copy
+
+try:
+    import ahocorasick
+except ImportError:  # опциональная зависимость (pyahocorasick)
+    ahocorasick = None
+
+# Пара [vendor:device] в выводе lspci -nn
+_LSPCI_ID_RE = re.compile(r'\[([0-9a-f]{4}):([0-9a-f]{4})\]')
+# Код класса устройства: [0300] VGA controller, [0302] 3D controller
+_LSPCI_CLASS_RE = re.compile(r'\[03(?:00|02)\]')
+
+# Узлы DRM: cardN указывает на устройство GPU
+SYSFS_DRM_DIR = '/sys/class/drm'
+
+# Время жизни кеша результатов обнаружения, секунд
+DEFAULT_CACHE_TTL = 5.0
+
+# Общий лимит времени на параллельный опрос методов обнаружения, секунд
+DETECTION_TIMEOUT = 15
+
+# Запрос nvidia-smi и период выдачи для постоянного потока (-lms), мс
+NVIDIA_SMI_QUERY = ['--query-gpu=gpu_name,pci.bus_id,memory.total', '--format=csv,noheader']
+SMI_STREAM_INTERVAL_MS = 1000
+# Пауза в выводе, после которой пачка строк (по одной на GPU) считается полной
+SMI_BURST_GAP = 0.05
+
+
+@dataclass(frozen=True)
+class MiningCardSpec:
+    """Описание модели майнинговой карты в базе данных"""
+    __slots__ = ('device_id', 'subsystem_vendor_id', 'chip', 'equivalent_gaming',
+                 'equivalent_device_id', 'memory_size', 'tensor_cores', 'sli_support',
+                 'patch_required')
+    
+    device_id: str
+    subsystem_vendor_id: Tuple[str, ...]
+    chip: str
+    equivalent_gaming: str
+    equivalent_device_id: str  # ID игровой карты для патча device_id
+    memory_size: int  # MB
+    tensor_cores: bool
+    sli_support: bool
+    patch_required: bool
+
+
+# База данных майнинговых карт
+_MINING_CARDS: Dict[str, MiningCardSpec] = {
+    # P104-100 (GTX 1080)
+    'P104-100': MiningCardSpec(
+        device_id='1B80',
+        subsystem_vendor_id=('1458', '1462', '10DE'),  # Gigabyte, MSI, NVIDIA
+        chip='GP104',
+        equivalent_gaming='GTX 1080',
+        equivalent_device_id='1B80',
+        memory_size=8192,  # MB
+        tensor_cores=False,
+        sli_support=True,
+        patch_required=True
+    ),
+    
+    # P106-100 (GTX 1060)
+    'P106-100': MiningCardSpec(
+        device_id='1C02',
+        subsystem_vendor_id=('1458', '1462', '10DE', '1569'),  # Gigabyte, MSI, NVIDIA, Palit
+        chip='GP106',
+        equivalent_gaming='GTX 1060 6GB',
+        equivalent_device_id='1C02',
+        memory_size=6144,
+        tensor_cores=False,
+        sli_support=False,
+        patch_required=True
+    ),
+    
+    # P102-100 (GTX 1070/Ti)
+    'P102-100': MiningCardSpec(
+        device_id='1BA1',
+        subsystem_vendor_id=('1458', '1462', '10DE'),
+        chip='GP102',
+        equivalent_gaming='GTX 1070 Ti',
+        equivalent_device_id='1BA1',
+        memory_size=8192,
+        tensor_cores=False,
+        sli_support=True,
+        patch_required=True
+    ),
+    
+    # P106-090 (GTX 1060 3GB)
+    'P106-090': MiningCardSpec(
+        device_id='1C03',
+        subsystem_vendor_id=('1458', '1462', '10DE'),
+        chip='GP106',
+        equivalent_gaming='GTX 1060 3GB',
+        equivalent_device_id='1C03',
+        memory_size=3072,
+        tensor_cores=False,
+        sli_support=False,
+        patch_required=True
+    ),
+    
+    # P104 (GTX 1080 Ti)
+    'P104': MiningCardSpec(
+        device_id='1B81',
+        subsystem_vendor_id=('1458', '1462', '10DE'),
+        chip='GP104',
+        equivalent_gaming='GTX 1080 Ti',
+        equivalent_device_id='1B81',
+        memory_size=11264,
+        tensor_cores=False,
+        sli_support=True,
+        patch_required=True
+    ),
+    
+    # Turing поколения (RTX 2060)
+    'TU116': MiningCardSpec(
+        device_id='1F08',
+        subsystem_vendor_id=('1458', '1462', '10DE'),
+        chip='TU116',
+        equivalent_gaming='RTX 2060',
+        equivalent_device_id='1F08',
+        memory_size=6144,
+        tensor_cores=True,
+        sli_support=False,
+        patch_required=True
+    )
+}
+
+# Обратные индексы для поиска карты за один проход. Ключи интернированы,
+# как и ID в _parse_*, так что сравнение ключей сводится к проверке идентичности
+_BY_DEVICE_ID = {sys.intern(info.device_id): (name, info) for name, info in _MINING_CARDS.items()}
+
+# Подстроки имени GPU из nvidia-smi в порядке приоритета: модель, затем чип
+_NAME_PATTERNS = tuple(
+    (pattern, name)
+    for name, info in _MINING_CARDS.items()
+    for pattern in (name, info.chip)
+)
+
+
+def _build_name_automaton():
+    """Автомат Ахо-Корасик по _NAME_PATTERNS: значение - (приоритет, модель)"""
+    if ahocorasick is None:
+        return None
+    
+    automaton = ahocorasick.Automaton()
+    for priority, (pattern, name) in enumerate(_NAME_PATTERNS):
+        if not automaton.exists(pattern):
+            automaton.add_word(pattern, (priority, name))
+    automaton.make_automaton()
+    return automaton
+
+
+_NAME_AUTOMATON = _build_name_automaton()
+
 
 class MiningCardDetector:
     """Детектор майнинговых видеокарт NVIDIA"""
     
-    def __init__(self):
+    # База данных и индексы по ней общие для всех экземпляров
+    mining_cards = _MINING_CARDS
+    _by_device_id = _BY_DEVICE_ID
+    _name_patterns = _NAME_PATTERNS
+    _name_automaton = _NAME_AUTOMATON
+    # Описания патчей зависят только от базы данных - строятся при первом создании детектора
+    _patches_by_model = None
+    
+    def __init__(self, persistent_smi: bool = False):
+        """persistent_smi: держать запущенный nvidia-smi -lms для частых опросов"""
         self.logger = logging.getLogger(__name__)
         
-        # База данных майнинговых карт
-        self.mining_cards = {
-            # P104-100 (GTX 1080)
-            'P104-100': {
-                'device_id': '1B80',
-                'subsystem_vendor_id': ['1458', '1462', '10DE'],  # Gigabyte, MSI, NVIDIA
-                'chip': 'GP104',
-                'equivalent_gaming': 'GTX 1080',
-                'memory_size': 8192,  # MB
-                'tensor_cores': False,
-                'sli_support': True,
-                'patch_required': True
-            },
-            
-            # P106-100 (GTX 1060)
-            'P106-100': {
-                'device_id': '1C02',
-                'subsystem_vendor_id': ['1458', '1462', '10DE', '1569'],  # Gigabyte, MSI, NVIDIA, Palit
-                'chip': 'GP106',
-                'equivalent_gaming': 'GTX 1060 6GB',
-                'memory_size': 6144,
-                'tensor_cores': False,
-                'sli_support': False,
-                'patch_required': True
-            },
-            
-            # P102-100 (GTX 1070/Ti)
-            'P102-100': {
-                'device_id': '1BA1',
-                'subsystem_vendor_id': ['1458', '1462', '10DE'],
-                'chip': 'GP102',
-                'equivalent_gaming': 'GTX 1070 Ti',
-                'memory_size': 8192,
-                'tensor_cores': False,
-                'sli_support': True,
-                'patch_required': True
-            },
-            
-            # P106-090 (GTX 1060 3GB)
-            'P106-090': {
-                'device_id': '1C03',
-                'subsystem_vendor_id': ['1458', '1462', '10DE'],
-                'chip': 'GP106',
-                'equivalent_gaming': 'GTX 1060 3GB',
-                'memory_size': 3072,
-                'tensor_cores': False,
-                'sli_support': False,
-                'patch_required': True
-            },
-            
-            # P104 (GTX 1080 Ti)
-            'P104': {
-                'device_id': '1B81',
-                'subsystem_vendor_id': ['1458', '1462', '10DE'],
-                'chip': 'GP104',
-                'equivalent_gaming': 'GTX 1080 Ti',
-                'memory_size': 11264,
-                'tensor_cores': False,
-                'sli_support': True,
-                'patch_required': True
-            },
-            
-            # Turing поколения (RTX 2060)
-            'TU116': {
-                'device_id': '1F08',
-                'subsystem_vendor_id': ['1458', '1462', '10DE'],
-                'chip': 'TU116',
-                'equivalent_gaming': 'RTX 2060',
-                'memory_size': 6144,
-                'tensor_cores': True,
-                'sli_support': False,
-                'patch_required': True
+        if MiningCardDetector._patches_by_model is None:
+            MiningCardDetector._patches_by_model = {
+                model: self._build_patches(model) for model in self.mining_cards
             }
-        }
+        
+        # Кеш результата detect_mining_cards
+        self._cache = None
+        self._cache_full = False
+        self._cache_ts = 0.0
+        try:
+            self._cache_ttl = float(os.environ.get('MINING_DETECTOR_CACHE_TTL', DEFAULT_CACHE_TTL))
+        except ValueError:
+            self._cache_ttl = DEFAULT_CACHE_TTL
+        
+        # Путь к nvidia-smi ищется в PATH один раз (может быть не в /usr/bin)
+        self._nvidia_smi_path = shutil.which('nvidia-smi')
+        
+        # Постоянный процесс nvidia-smi -lms и разбор его вывода
+        self._persistent_smi = persistent_smi
+        self._smi_proc = None
+        self._smi_pending = b''
+        self._smi_burst = {}
+        self._smi_sample = []
+    
+    def close(self):
+        """Остановка постоянного процесса nvidia-smi"""
+        proc, self._smi_proc = self._smi_proc, None
+        if proc is None:
+            return
+        try:
+            proc.kill()
+            proc.wait()
+            proc.stdout.close()
+        except Exception as e:
+            self.logger.debug(f"Error stopping nvidia-smi stream: {e}")
+    
+    def __del__(self):
+        try:
+            self.close()
+        except Exception:
+            pass
     
-    def detect_mining_cards(self) -> List[Dict]:
-        """Обнаружение майнинговых карт в системе"""
-        detected_cards = []
+    def invalidate(self):
+        """Сброс кеша обнаружения (например, после применения патча)"""
+        self._cache = None
+    
+    def detect_mining_cards(self, force_full: bool = False) -> List[Dict]:
+        """Обнаружение майнинговых карт в системе
+        
+        lspci и sysfs опрашиваются параллельно; если lspci уже нашел карты,
+        nvidia-smi не запускается.
+        Поле detected_memory заполняет только nvidia-smi, поэтому вызывающим,
+        которым оно нужно, следует передавать force_full=True.
+        
+        Результат кешируется на MINING_DETECTOR_CACHE_TTL секунд (по умолчанию 5),
+        invalidate() сбрасывает кеш.
+        """
+        now = time.monotonic()
+        if (self._cache is not None and now - self._cache_ts < self._cache_ttl
+                and (self._cache_full or not force_full)):
+            # Копии карт, чтобы изменения у вызывающего не портили кеш
+            return [dict(card) for card in self._cache]
+        
+        # Карты по PCI адресу: первый нашедший метод имеет приоритет
+        by_addr: Dict[str, Dict] = {}
+        full = True
         
         try:
-            # Метод 1: через lspci
-            lspci_cards = self._detect_via_lspci()
-            detected_cards.extend(lspci_cards)
+            # Методы независимы и опрашиваются параллельно. nvidia-smi - самый
+            # дорогой, без force_full он нужен, только если lspci ничего не нашел
+            methods = [self._detect_via_lspci]
+            if force_full and self._nvidia_smi_path:
+                methods.append(self._detect_via_nvidia_smi)
+            methods.append(self._detect_via_sysfs)
+            results = self._run_detectors(methods)
             
-            # Метод 2: через nvidia-smi (если драйвер уже загружен)
-            if os.path.exists('/usr/bin/nvidia-smi'):
-                smi_cards = self._detect_via_nvidia_smi()
-                # Объединяем результаты, удаляя дубликаты
-                detected_cards = self._merge_card_lists(detected_cards, smi_cards)
+            lspci_cards = results[0]
+            if lspci_cards and not force_full:
+                full = False
+            elif not force_full and self._nvidia_smi_path:
+                results.insert(1, self._detect_via_nvidia_smi())
             
-            # Метод 3: через sysfs
-            sysfs_cards = self._detect_via_sysfs()
-            detected_cards = self._merge_card_lists(detected_cards, sysfs_cards)
+            # Порядок приоритета: lspci, nvidia-smi, sysfs
+            for cards in results:
+                for card in cards:
+                    by_addr.setdefault(card['pci_address'], card)
             
         except Exception as e:
             self.logger.error(f"Ошибка при обнаружении майнинговых карт: {e}")
         
+        detected_cards = list(by_addr.values())
         self.logger.info(f"Обнаружено майнинговых карт: {len(detected_cards)}")
-        return detected_cards
+        self._cache = detected_cards
+        self._cache_full = full
+        self._cache_ts = now
+        return [dict(card) for card in detected_cards]
+    
+    def _run_detectors(self, methods: List) -> List[List[Dict]]:
+        """Параллельный запуск методов обнаружения
+        
+        Результаты возвращаются в порядке methods; метод, не уложившийся
+        в DETECTION_TIMEOUT, дает пустой список.
+        """
+        executor = ThreadPoolExecutor(max_workers=len(methods))
+        try:
+            futures = [executor.submit(method) for method in methods]
+            done, not_done = wait(futures, timeout=DETECTION_TIMEOUT)
+            
+            results = []
+            for method, future in zip(methods, futures):
+                if future in not_done:
+                    self.logger.warning(f"{method.__name__} не завершился за {DETECTION_TIMEOUT} с")
+                    results.append([])
+                    continue
+                try:
+                    results.append(future.result())
+                except Exception as e:
+                    self.logger.debug(f"{method.__name__} failed: {e}")
+                    results.append([])
+            return results
+        finally:
+            # Не ждем зависшие методы - их процессы ограничены собственными таймаутами
+            executor.shutdown(wait=False)
     
     def _detect_via_lspci(self) -> List[Dict]:
         """Обнаружение через lspci"""
         cards = []
         
         try:
-            result = subprocess.run(
-                ['lspci', '-nn', '-D'],
-                capture_output=True, text=True, timeout=10
-            )
-            
-            for line in result.stdout.split('\n'):
-                if 'VGA' in line or '3D' in line:
-                    card_info = self._parse_lspci_line(line)
-                    if card_info and card_info['is_mining']:
-                        cards.append(card_info)
-                        self.logger.info(f"Найдена майнинговая карта: {card_info['model']}")
+            for line in self._iter_command_lines(['lspci', '-nn', '-D']):
+                # Быстрый отсев строк, не относящихся к видеоадаптерам
+                if not _LSPCI_CLASS_RE.search(line):
+                    continue
+                
+                card_info = self._parse_lspci_line(line)
+                if card_info and card_info['is_mining']:
+                    cards.append(card_info)
+                    self.logger.info(f"Найдена майнинговая карта: {card_info['model']}")
         
         except Exception as e:
             self.logger.debug(f"lspci detection failed: {e}")
         
         return cards
     
+    def _iter_command_lines(self, argv: List[str], timeout: float = 10):
+        """Построчное чтение stdout команды без буферизации всего вывода
+        
+        Процесс завершается по истечении timeout секунд или при досрочном
+        прекращении итерации.
+        """
+        proc = subprocess.Popen(argv, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                                text=True, start_new_session=True)
+        
+        def kill_group():
+            # Вместе с потомками, иначе они держат pipe открытым
+            try:
+                os.killpg(proc.pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+        
+        timer = threading.Timer(timeout, kill_group)
+        timer.daemon = True
+        timer.start()
+        try:
+            with proc:
+                try:
+                    for line in proc.stdout:
+                        yield line
+                except GeneratorExit:
+                    kill_group()
+                    raise
+        finally:
+            timer.cancel()
+    
     def _parse_lspci_line(self, line: str) -> Optional[Dict]:
         """Парсинг строки lspci"""
-        try:
-            # Пример строки:
-            # 01:00.0 VGA compatible controller [0300]: NVIDIA Corporation GP104 [GeForce GTX 1080] [10de:1b80] (rev a1)
-            
-            # Извлечение PCI адреса
-            pci_address = line.split()[0]
-            
-            # Извлечение ID устройства и вендора
-            device_match = re.search(r'\[([0-9a-f]{4}):([0-9a-f]{4})\]', line)
+        # Пример строки:
+        # 01:00.0 VGA compatible controller [0300]: NVIDIA Corporation GP104 [GeForce GTX 1080] [10de:1b80] (rev a1)
+        
+        # Извлечение PCI адреса
+        pci_address = line.split()[0]
+        
+        # Извлечение ID устройства и вендора: в формате -nn пара
+        # [vvvv:dddd] - последняя скобка в строке
+        rb = line.rfind('[')
+        token = line[rb + 1:rb + 11] if rb >= 0 else ''
+        if len(token) == 10 and token[4] == ':' and token[9] == ']':
+            vendor_id = token[:4].upper()
+            device_id = token[5:9].upper()
+        else:
+            # Нестандартная строка - ищем пару регулярным выражением
+            device_match = _LSPCI_ID_RE.search(line)
             if not device_match:
                 return None
             
             vendor_id = device_match.group(1).upper()
             device_id = device_match.group(2).upper()
-            
-            # Проверяем, является ли это NVIDIA
-            if vendor_id != '10DE':
-                return None
-            
-            # Ищем в базе данных майнинговых карт
-            for model_name, model_info in self.mining_cards.items():
-                if model_info['device_id'] == device_id:
-                    return {
-                        'pci_address': pci_address,
-                        'vendor_id': vendor_id,
-                        'device_id': device_id,
-                        'model': model_name,
-                        'chip': model_info['chip'],
-                        'equivalent_gaming': model_info['equivalent_gaming'],
-                        'memory_size': model_info['memory_size'],
-                        'tensor_cores': model_info['tensor_cores'],
-                        'sli_support': model_info['sli_support'],
-                        'patch_required': model_info['patch_required'],
-                        'is_mining': True,
-                        'detection_method': 'lspci'
-                    }
-            
+        
+        # Проверяем, является ли это NVIDIA
+        if vendor_id != '10DE':
             return None
         
-        except Exception as e:
-            self.logger.debug(f"Error parsing lspci line: {e}")
+        # Ищем в базе данных майнинговых карт
+        device_id = sys.intern(device_id)
+        hit = self._by_device_id.get(device_id)
+        if hit is None:
             return None
+        
+        model_name, model_info = hit
+        return self._build_card(model_name, model_info, 'lspci',
+                                pci_address=pci_address,
+                                vendor_id=vendor_id,
+                                device_id=device_id)
     
     def _detect_via_nvidia_smi(self) -> List[Dict]:
-        """Обнаружение через nvidia-smi"""
+        """Обнаружение через NVML или, если он недоступен, через nvidia-smi"""
+        try:
+            nvml_cards = self._detect_via_nvml()
+            if nvml_cards is not None:
+                return nvml_cards
+        except Exception as e:
+            self.logger.debug(f"NVML detection failed: {e}")
+        
         cards = []
         
         try:
-            result = subprocess.run(
-                ['nvidia-smi', '--query-gpu=gpu_name,pci.bus_id,memory.total', '--format=csv,noheader'],
-                capture_output=True, text=True, timeout=10
-            )
+            if self._persistent_smi:
+                lines = self._read_smi_sample()
+            else:
+                lines = self._iter_command_lines([self._nvidia_smi_path] + NVIDIA_SMI_QUERY)
             
-            for line in result.stdout.split('\n'):
-                if line.strip():
-                    card_info = self._parse_nvidia_smi_line(line)
-                    if card_info and card_info['is_mining']:
-                        cards.append(card_info)
+            # Пустые строки отсеивает проверка числа полей в _parse_nvidia_smi_line
+            for line in lines:
+                card_info = self._parse_nvidia_smi_line(line)
+                if card_info and card_info['is_mining']:
+                    cards.append(card_info)
         
         except Exception as e:
             self.logger.debug(f"nvidia-smi detection failed: {e}")
         
         return cards
     
+    def _ensure_smi_stream(self) -> subprocess.Popen:
+        """Запуск nvidia-smi -lms, если он еще не запущен или завершился"""
+        if self._smi_proc is not None and self._smi_proc.poll() is None:
+            return self._smi_proc
+        
+        self.close()
+        self._smi_pending = b''
+        self._smi_burst = {}
+        self._smi_sample = []
+        self._smi_proc = subprocess.Popen(
+            [self._nvidia_smi_path] + NVIDIA_SMI_QUERY + ['-lms', str(SMI_STREAM_INTERVAL_MS)],
+            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL
+        )
+        return self._smi_proc
+    
+    def _read_smi_sample(self, timeout: float = 10) -> List[str]:
+        """Последний полный набор строк из потока nvidia-smi -lms
+        
+        Читает все накопившиеся данные без блокировки; при первом вызове
+        ждет первую пачку строк не дольше timeout секунд.
+        """
+        proc = self._ensure_smi_stream()
+        fd = proc.stdout.fileno()
+        poll_timeout = 0 if self._smi_sample else timeout
+        
+        while True:
+            ready, _, _ = select.select([fd], [], [], poll_timeout)
+            if not ready:
+                break
+            
+            chunk = os.read(fd, 65536)
+            if not chunk:
+                # Процесс завершился - при следующем опросе будет перезапущен
+                self.close()
+                break
+            
+            lines = (self._smi_pending + chunk).split(b'\n')
+            self._smi_pending = lines.pop()
+            for raw in lines:
+                line = raw.decode('utf-8', 'replace').strip()
+                if not line:
+                    continue
+                # Повтор адреса - началась следующая выборка
+                parts = line.split(',')
+                bus_id = parts[1].strip() if len(parts) > 1 else line
+                if bus_id in self._smi_burst:
+                    self._smi_sample = list(self._smi_burst.values())
+                    self._smi_burst = {}
+                self._smi_burst[bus_id] = line
+            
+            poll_timeout = SMI_BURST_GAP
+        
+        # Пауза в выводе - текущая пачка завершена
+        if self._smi_burst and not self._smi_pending:
+            self._smi_sample = list(self._smi_burst.values())
+            self._smi_burst = {}
+        
+        return self._smi_sample
+    
+    def _detect_via_nvml(self) -> Optional[List[Dict]]:
+        """Обнаружение через NVML (pynvml) без запуска nvidia-smi
+        
+        Возвращает None, если pynvml не установлен или NVML не инициализируется.
+        """
+        try:
+            import pynvml
+            pynvml.nvmlInit()
+        except Exception as e:
+            self.logger.debug(f"NVML недоступен: {e}")
+            return None
+        
+        cards = []
+        try:
+            for index in range(pynvml.nvmlDeviceGetCount()):
+                handle = pynvml.nvmlDeviceGetHandleByIndex(index)
+                # Старые версии pynvml возвращают bytes, новые - str
+                name = pynvml.nvmlDeviceGetName(handle)
+                if isinstance(name, bytes):
+                    name = name.decode('ascii', 'replace')
+                pci_bus_id = pynvml.nvmlDeviceGetPciInfo(handle).busId
+                if isinstance(pci_bus_id, bytes):
+                    pci_bus_id = pci_bus_id.decode('ascii', 'replace')
+                memory_mb = pynvml.nvmlDeviceGetMemoryInfo(handle).total // (1024 * 1024)
+                
+                card_info = self._match_gpu_name(name, pci_bus_id, memory_mb, 'nvml')
+                if card_info:
+                    cards.append(card_info)
+        finally:
+            pynvml.nvmlShutdown()
+        
+        return cards
+    
     def _parse_nvidia_smi_line(self, line: str) -> Optional[Dict]:
         """Парсинг строки nvidia-smi"""
+        parts = line.split(',')
+        if len(parts) < 3:
+            return None
+        
+        name = parts[0].strip()
+        pci_bus_id = parts[1].strip()
+        memory_total = parts[2].strip()
+        
+        # Конвертация памяти в MB
+        memory_mb = 0
         try:
-            parts = line.split(',')
-            if len(parts) < 3:
-                return None
-            
-            name = parts[0].strip()
-            pci_bus_id = parts[1].strip()
-            memory_total = parts[2].strip()
-            
-            # Конвертация памяти в MB
-            memory_mb = 0
             if 'MiB' in memory_total:
                 memory_mb = int(memory_total.replace('MiB', '').strip())
             elif 'GiB' in memory_total:
                 memory_mb = int(float(memory_total.replace('GiB', '').strip())) * 1024
-            
-            # Проверяем на майнинговые карты по имени
-            for model_name, model_info in self.mining_cards.items():
-                if model_name in name or model_info['chip'] in name:
-                    return {
-                        'pci_address': pci_bus_id,
-                        'model': model_name,
-                        'chip': model_info['chip'],
-                        'equivalent_gaming': model_info['equivalent_gaming'],
-                        'memory_size': model_info['memory_size'],
-                        'detected_memory': memory_mb,
-                        'tensor_cores': model_info['tensor_cores'],
-                        'sli_support': model_info['sli_support'],
-                        'patch_required': model_info['patch_required'],
-                        'is_mining': True,
-                        'detection_method': 'nvidia-smi'
-                    }
-            
+        except ValueError:
+            self.logger.debug(f"Error parsing nvidia-smi memory: {memory_total}")
             return None
         
-        except Exception as e:
-            self.logger.debug(f"Error parsing nvidia-smi line: {e}")
+        return self._match_gpu_name(name, pci_bus_id, memory_mb, 'nvidia-smi')
+    
+    def _match_gpu_name(self, name: str, pci_bus_id: str, memory_mb: int,
+                        detection_method: str) -> Optional[Dict]:
+        """Поиск майнинговой карты по имени GPU (из nvidia-smi или NVML)"""
+        model_name = None
+        if self._name_automaton is not None:
+            # Один проход по имени; из совпадений берем наиболее приоритетное
+            matches = [value for _, value in self._name_automaton.iter(name)]
+            if matches:
+                model_name = min(matches)[1]
+        else:
+            for pattern, candidate in self._name_patterns:
+                if pattern in name:
+                    model_name = candidate
+                    break
+        
+        if model_name is None:
             return None
+        
+        return self._build_card(model_name, self.mining_cards[model_name], detection_method,
+                                pci_address=pci_bus_id,
+                                detected_memory=memory_mb)
     
     def _detect_via_sysfs(self) -> List[Dict]:
         """Обнаружение через sysfs"""
         cards = []
         
         try:
-            gpu_dirs = Path('/sys/bus/pci/devices').glob('*/gpu')
+            seen_devices = set()
             
-            for gpu_dir in gpu_dirs:
-                if gpu_dir.is_dir():
-                    card_info = self._parse_sysfs_gpu(gpu_dir)
+            with os.scandir(SYSFS_DRM_DIR) as entries:
+                for entry in entries:
+                    # card0, card1...; card0-HDMI-A-1 и renderD128 - не отдельные GPU
+                    if not entry.name.startswith('card') or '-' in entry.name:
+                        continue
+                    
+                    pci_dir = os.path.realpath(entry.path + '/device')
+                    if pci_dir in seen_devices:
+                        continue
+                    seen_devices.add(pci_dir)
+                    
+                    card_info = self._parse_sysfs_gpu(pci_dir)
                     if card_info and card_info['is_mining']:
                         cards.append(card_info)
         
@@ -265,65 +594,56 @@ class MiningCardDetector:
         
         return cards
     
-    def _parse_sysfs_gpu(self, gpu_dir: Path) -> Optional[Dict]:
-        """Парсинг информации о GPU из sysfs"""
+    def _parse_sysfs_gpu(self, pci_dir: str) -> Optional[Dict]:
+        """Парсинг информации о GPU из каталога устройства в sysfs"""
+        # Чтение vendor и device ID (формат '0x10de\n')
         try:
-            # Чтение vendor и device ID
-            vendor_file = gpu_dir.parent / 'vendor'
-            device_file = gpu_dir.parent / 'device'
-            
-            if not (vendor_file.exists() and device_file.exists()):
-                return None
-            
-            with open(vendor_file, 'r') as f:
-                vendor_id = f.read().strip().replace('0x', '').upper()
-            
-            with open(device_file, 'r') as f:
-                device_id = f.read().strip().replace('0x', '').upper()
-            
-            if vendor_id != '10DE':
-                return None
-            
-            # Проверяем в базе данных
-            for model_name, model_info in self.mining_cards.items():
-                if model_info['device_id'] == device_id:
-                    return {
-                        'pci_address': gpu_dir.parent.name,
-                        'vendor_id': vendor_id,
-                        'device_id': device_id,
-                        'model': model_name,
-                        'chip': model_info['chip'],
-                        'equivalent_gaming': model_info['equivalent_gaming'],
-                        'memory_size': model_info['memory_size'],
-                        'tensor_cores': model_info['tensor_cores'],
-                        'sli_support': model_info['sli_support'],
-                        'patch_required': model_info['patch_required'],
-                        'is_mining': True,
-                        'detection_method': 'sysfs'
-                    }
-            
+            with open(pci_dir + '/vendor', 'rb') as f:
+                vendor_id = f.read().strip()[2:].upper().decode()
+            with open(pci_dir + '/device', 'rb') as f:
+                device_id = f.read().strip()[2:].upper().decode()
+        except (OSError, UnicodeDecodeError) as e:
+            self.logger.debug(f"Error reading sysfs IDs in {pci_dir}: {e}")
             return None
         
-        except Exception as e:
-            self.logger.debug(f"Error parsing sysfs GPU: {e}")
+        if vendor_id != '10DE':
             return None
-    
-    def _merge_card_lists(self, list1: List[Dict], list2: List[Dict]) -> List[Dict]:
-        """Объединение списков карт без дубликатов"""
-        merged = list1.copy()
-        seen_addresses = {card['pci_address'] for card in list1}
         
-        for card in list2:
-            if card['pci_address'] not in seen_addresses:
-                merged.append(card)
+        # Проверяем в базе данных
+        device_id = sys.intern(device_id)
+        hit = self._by_device_id.get(device_id)
+        if hit is None:
+            return None
         
-        return merged
+        model_name, model_info = hit
+        return self._build_card(model_name, model_info, 'sysfs',
+                                pci_address=os.path.basename(pci_dir),
+                                vendor_id=vendor_id,
+                                device_id=device_id)
+    
+    def _build_card(self, model_name: str, model_info: MiningCardSpec, detection_method: str, **fields) -> Dict:
+        """Описание найденной карты: fields (адрес, ID) + данные из базы"""
+        card = dict(fields)
+        card.update({
+            'model': model_name,
+            'chip': model_info.chip,
+            'equivalent_gaming': model_info.equivalent_gaming,
+            'memory_size': model_info.memory_size,
+            'tensor_cores': model_info.tensor_cores,
+            'sli_support': model_info.sli_support,
+            'patch_required': model_info.patch_required,
+            'is_mining': True,
+            'detection_method': detection_method
+        })
+        return card
     
     def get_mining_card_patches(self, model: str) -> Dict:
         """Получить информацию о необходимых патчах для модели"""
-        if model not in self.mining_cards:
-            return {}
-        
+        # Копия, чтобы вызывающий код не мог изменить общий кеш
+        return copy.deepcopy(self._patches_by_model.get(model, {}))
+    
+    def _build_patches(self, model: str) -> Dict:
+        """Построение описания патчей для модели из базы данных"""
         card_info = self.mining_cards[model]
         patches = {}
         
@@ -333,20 +653,20 @@ class MiningCardDetector:
             'operations': [
                 {
                     'type': 'device_id_patch',
-                    'original_id': card_info['device_id'],
-                    'target_id': self._get_equivalent_device_id(model),
-                    'description': f'ID модификация для {card_info["equivalent_gaming"]}'
+                    'original_id': card_info.device_id,
+                    'target_id': card_info.equivalent_device_id,
+                    'description': f'ID модификация для {card_info.equivalent_gaming}'
                 },
                 {
                     'type': 'sli_enable',
-                    'enabled': card_info['sli_support'],
+                    'enabled': card_info.sli_support,
                     'description': 'Разблокировка SLI поддержки'
                 }
             ]
         }
         
         # Дополнительные патчи для AI workloads
-        if card_info['tensor_cores']:
+        if card_info.tensor_cores:
             patches['ai_optimization'] = {
                 'description': 'Оптимизация для AI/ML нагрузок',
                 'operations': [
@@ -364,7 +684,7 @@ class MiningCardDetector:
             }
         
         # SLI патчи для смешанных конфигураций
-        if card_info['sli_support']:
+        if card_info.sli_support:
             patches['sli_mixed'] = {
                 'description': 'SLI для смешанных конфигураций',
                 'operations': [
@@ -378,18 +698,6 @@ class MiningCardDetector:
         
         return patches
     
-    def _get_equivalent_device_id(self, model: str) -> str:
-        """Получить ID эквивалентной игровой карты"""
-        equivalents = {
-            'P104-100': '1B80',  # GTX 1080
-            'P106-100': '1C02',  # GTX 1060 6GB
-            'P102-100': '1BA1',  # GTX 1070 Ti
-            'P106-090': '1C03',  # GTX 1060 3GB
-            'P104': '1B81',      # GTX 1080 Ti
-            'TU116': '1F08'      # RTX 2060
-        }
-        return equivalents.get(model, model)
-    
     def validate_sli_configuration(self, cards: List[Dict]) -> Dict:
         """Валидация SLI конфигурации"""
         validation = {
@@ -409,10 +717,20 @@ class MiningCardDetector:
             validation['issues'].append('Недостаточно карт с поддержкой SLI')
             return validation
         
-        # Проверяем одинаковость чипов для стандартного SLI
-        chip_types = list(set(card['chip'] for card in sli_cards))
+        # Один проход: ищем различия в чипах и объеме памяти
+        first_chip = sli_cards[0]['chip']
+        first_mem = sli_cards[0]['memory_size']
+        mixed_chip = mixed_mem = False
+        for card in sli_cards:
+            if card['chip'] != first_chip:
+                mixed_chip = True
+            if card['memory_size'] != first_mem:
+                mixed_mem = True
+            if mixed_chip and mixed_mem:
+                break
         
-        if len(chip_types) == 1:
+        # Проверяем одинаковость чипов для стандартного SLI
+        if not mixed_chip:
             validation['sli_possible'] = True
             validation['recommendations'].append('Стандартный SLI возможен')
         else:
@@ -421,8 +739,7 @@ class MiningCardDetector:
             validation['recommendations'].append('Возможен смешанный SLI (требуется патч)')
         
         # Проверяем память
-        memory_sizes = [card['memory_size'] for card in sli_cards]
-        if len(set(memory_sizes)) > 1:
+        if mixed_mem:
             validation['issues'].append('Разный размер памяти у карт')
             validation['recommendations'].append('Рекомендуется использовать карты с одинаковым объемом памяти')
         
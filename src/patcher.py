@@ -12,6 +12,7 @@ import argparse
 import logging
 import hashlib
 import json
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 from typing import Optional, List, Dict, Tuple
 
@@ -21,6 +22,47 @@ from mining_card_detector import MiningCardDetector
 from sli_manager import SLIManager
 from ai_optimizer import AIOptimizer
 
+try:
+    import blake3
+except ImportError:  # опциональная зависимость
+    blake3 = None
+
+# Размер блока при потоковом хешировании модулей
+HASH_CHUNK_SIZE = 1 << 20
+
+# Максимум одновременно запущенных процессов patch
+MAX_PATCH_WORKERS = 4
+
+# Перезагрузка модулей одним процессом sh вместо rmmod/modprobe на каждый модуль.
+# Списки модулей передаются через окружение; на каждый модуль в stdout выводится
+# строка статуса, текст ошибки команды (переводы строк заменены пробелами,
+# без разбиения на слова и раскрытия шаблонов оболочкой) - в ее конце
+RELOAD_MODULES_SCRIPT = """
+for m in $NVIDIA_UNLOAD; do
+    if err=$(rmmod "$m" 2>&1); then echo "unload $m ok"; else echo "unload $m fail $(printf %s "$err" | tr '\\n' ' ')"; fi
+done
+for m in $NVIDIA_LOAD; do
+    if err=$(modprobe "$m" 2>&1); then echo "load $m ok"; else echo "load $m fail $(printf %s "$err" | tr '\\n' ' ')"; exit 1; fi
+done
+"""
+
+
+def _sha256_file(f) -> str:
+    """SHA256 открытого в бинарном режиме файла без чтения его целиком в память"""
+    if hasattr(hashlib, 'file_digest'):  # Python 3.11+
+        return hashlib.file_digest(f, 'sha256').hexdigest()
+    
+    h = hashlib.sha256()
+    buf = bytearray(HASH_CHUNK_SIZE)
+    view = memoryview(buf)
+    while True:
+        n = f.readinto(view)
+        if not n:
+            break
+        h.update(view[:n])
+    return h.hexdigest()
+
+
 class NvidiaPatcher:
     """Основной класс патчера NVIDIA драйверов"""
     
@@ -28,12 +70,13 @@ class NvidiaPatcher:
         self.setup_logging(log_level)
         self.logger = logging.getLogger(__name__)
         self.driver_detector = DriverDetector()
-        self.backup_manager = BackupManager()
+        # Общий детектор: кеши драйверов и путей модулей заполняются один раз за запуск
+        self.backup_manager = BackupManager(detector=self.driver_detector)
         self.mining_card_detector = MiningCardDetector()
         self.sli_manager = SLIManager()
         self.ai_optimizer = AIOptimizer()
         self.patch_dir = Path(__file__).parent.parent / "patches"
-        self.supported_versions = ["535.274.02"]
+        self.supported_versions = frozenset(("535.274.02",))
         
     def setup_logging(self, level):
         """Настройка логирования"""
@@ -131,9 +174,16 @@ class NvidiaPatcher:
                 self.logger.error(f"Файл драйвера не найден: {driver_path}")
                 return False
             
-            # Проверка контрольной суммы
+            # Проверка контрольной суммы; сумма только логируется,
+            # поэтому при наличии blake3 берется более быстрый алгоритм
+            if blake3 is not None:
+                hasher = blake3.blake3(max_threads=blake3.blake3.AUTO)
+                hasher.update_mmap(driver_path)
+                self.logger.info(f"BLAKE3 драйвера: {hasher.hexdigest()}")
+                return True
+            
             with open(driver_path, 'rb') as f:
-                file_hash = hashlib.sha256(f.read()).hexdigest()
+                file_hash = _sha256_file(f)
             
             self.logger.info(f"SHA256 драйвера: {file_hash}")
             return True
@@ -174,6 +224,7 @@ class NvidiaPatcher:
             # Получаем пути к модулям драйвера
             nvidia_paths = self.driver_detector.get_nvidia_module_paths(driver_info)
             
+            module_paths = []
             for module_path in nvidia_paths:
                 if not os.path.exists(module_path):
                     self.logger.warning(f"Модуль не найден: {module_path}")
@@ -185,16 +236,46 @@ class NvidiaPatcher:
                     self.logger.info(f"[DRY RUN] Применение патча к {module_path}")
                     continue
                 
-                # Применяем патч
-                result = subprocess.run([
-                    'patch', '-b', module_path, str(patch_file)
-                ], capture_output=True, text=True)
+                module_paths.append(module_path)
+            
+            if not module_paths:
+                return True
+            
+            # Модули независимы - патчим параллельно (subprocess не держит GIL)
+            failed = False
+            with ThreadPoolExecutor(max_workers=min(MAX_PATCH_WORKERS, len(module_paths))) as executor:
+                futures = {
+                    executor.submit(subprocess.run, ['patch', '-b', module_path, str(patch_file)],
+                                    capture_output=True, text=True): module_path
+                    for module_path in module_paths
+                }
                 
-                if result.returncode == 0:
-                    self.logger.info(f"Патч успешно применен к {module_path}")
-                else:
-                    self.logger.error(f"Ошибка применения патча к {module_path}: {result.stderr}")
-                    return False
+                for future in as_completed(futures):
+                    module_path = futures[future]
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        self.logger.error(f"Ошибка применения патча к {module_path}: {e}")
+                        failed = True
+                    else:
+                        if result.returncode == 0:
+                            self.logger.info(f"Патч успешно применен к {module_path}")
+                        else:
+                            self.logger.error(f"Ошибка применения патча к {module_path}: {result.stderr}")
+                            failed = True
+                    
+                    if failed:
+                        # Еще не запущенные задачи отменяются, запущенные дожидаются в with
+                        for pending in futures:
+                            pending.cancel()
+                        break
+            
+            if failed:
+                # Часть модулей могла быть уже пропатчена - возвращаем исходное состояние
+                self.logger.info("Откат уже пропатченных модулей из резервной копии...")
+                if not self.backup_manager.restore_backup(driver_info):
+                    self.logger.error("Не удалось восстановить модули из резервной копии")
+                return False
             
             return True
             
@@ -207,23 +288,29 @@ class NvidiaPatcher:
         try:
             self.logger.info("Перезагрузка модулей NVIDIA...")
             
-            # Выгрузка модулей
             modules = ['nvidia_drm', 'nvidia_uvm', 'nvidia_modeset', 'nvidia']
-            for module in reversed(modules):
-                try:
-                    subprocess.run(['rmmod', module], check=True)
-                    self.logger.info(f"Модуль {module} выгружен")
-                except subprocess.CalledProcessError:
-                    self.logger.warning(f"Не удалось выгрузить модуль {module}")
-            
-            # Загрузка модулей
-            for module in modules:
-                try:
-                    subprocess.run(['modprobe', module], check=True)
+            env = dict(os.environ,
+                       NVIDIA_UNLOAD=' '.join(reversed(modules)),
+                       NVIDIA_LOAD=' '.join(modules))
+            result = subprocess.run(['sh', '-c', RELOAD_MODULES_SCRIPT], env=env,
+                                    capture_output=True, text=True)
+            
+            for line in result.stdout.splitlines():
+                # "<unload|load> <модуль> <ok|fail> [текст ошибки]"
+                action, module, status, *error = line.split(maxsplit=3)
+                if action == 'unload':
+                    if status == 'ok':
+                        self.logger.info(f"Модуль {module} выгружен")
+                    else:
+                        self.logger.warning(f"Не удалось выгрузить модуль {module}")
+                        self.logger.debug(f"rmmod {module}: {' '.join(error)}")
+                elif status == 'ok':
                     self.logger.info(f"Модуль {module} загружен")
-                except subprocess.CalledProcessError as e:
-                    self.logger.error(f"Не удалось загрузить модуль {module}: {e}")
-                    return False
+                else:
+                    self.logger.error(f"Не удалось загрузить модуль {module}: {' '.join(error)}")
+            
+            if result.returncode != 0:
+                return False
             
             self.logger.info("Модули NVIDIA успешно перезагружены")
             return True
@@ -0,0 +1,95 @@
+"""
+Тесты детектора драйверов NVIDIA
+"""
+
+import os
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+from driver_detector import DriverDetector, _PROC_VER_RE
+
+
+class IterNvidiaKoTest(unittest.TestCase):
+    """Выбор копии модуля при нескольких одноименных файлах"""
+    
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = self.tmp.name
+        self.detector = DriverDetector()
+    
+    def tearDown(self):
+        self.tmp.cleanup()
+    
+    def _touch(self, relative_path: str) -> str:
+        path = os.path.join(self.root, relative_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        Path(path).touch()
+        return path
+    
+    def test_updates_preferred_over_kernel(self):
+        self._touch('kernel/drivers/video/nvidia.ko')
+        dkms = self._touch('updates/dkms/nvidia.ko')
+        
+        paths = list(self.detector._iter_nvidia_ko(self.root))
+        
+        self.assertEqual(paths, [dkms])
+    
+    def test_extra_preferred_over_kernel(self):
+        self._touch('kernel/drivers/video/nvidia-drm.ko')
+        extra = self._touch('extra/nvidia-drm.ko')
+        
+        paths = list(self.detector._iter_nvidia_ko(self.root))
+        
+        self.assertEqual(paths, [extra])
+    
+    def test_updates_preferred_over_extra(self):
+        self._touch('extra/nvidia.ko')
+        updates = self._touch('updates/nvidia.ko')
+        
+        paths = list(self.detector._iter_nvidia_ko(self.root))
+        
+        self.assertEqual(paths, [updates])
+    
+    def test_duplicates_resolved_by_name_order(self):
+        first = self._touch('kernel/a/nvidia.ko')
+        self._touch('kernel/b/nvidia.ko')
+        
+        paths = list(self.detector._iter_nvidia_ko(self.root))
+        
+        self.assertEqual(paths, [first])
+    
+    def test_each_module_found_once(self):
+        self._touch('kernel/drivers/video/nvidia.ko')
+        self._touch('kernel/drivers/video/nvidia-uvm.ko')
+        self._touch('updates/dkms/nvidia.ko')
+        self._touch('build/nvidia-modeset.ko')
+        
+        names = sorted(os.path.basename(p) for p in self.detector._iter_nvidia_ko(self.root))
+        
+        self.assertEqual(names, ['nvidia-uvm.ko', 'nvidia.ko'])
+
+
+class ProcVersionTest(unittest.TestCase):
+    """Разбор /proc/driver/nvidia/version"""
+    
+    def test_proprietary_module_banner(self):
+        banner = ("NVRM version: NVIDIA UNIX x86_64 Kernel Module  535.274.02  "
+                  "Thu Sep 25 05:43:58 UTC 2025\n"
+                  "GCC version:  gcc version 12.2.0 (Debian 12.2.0-14)\n")
+        
+        self.assertEqual(_PROC_VER_RE.search(banner).group(1), '535.274.02')
+    
+    def test_open_module_banner(self):
+        banner = ("NVRM version: NVIDIA UNIX Open Kernel Module for x86_64  535.274.02  "
+                  "Release Build  (dvs-builder@U16-I3-A03-3-2)  Thu Sep 25 05:25:45 UTC 2025\n"
+                  "GCC version:  gcc version 12.2.0 (Debian 12.2.0-14)\n")
+        
+        self.assertEqual(_PROC_VER_RE.search(banner).group(1), '535.274.02')
+
+
+if __name__ == '__main__':
+    unittest.main()
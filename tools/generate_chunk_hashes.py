@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+"""
+Генерация таблицы контрольных сумм блоков пропатченного модуля NVIDIA
+для PATCH_SIGNATURES в verify_patch.py
+"""
+
+import sys
+import hashlib
+import argparse
+
+from verify_patch import CHUNK_HASH_SIZE
+
+
+def chunk_hashes(module_path: str, chunk_size: int = CHUNK_HASH_SIZE):
+    """SHA256 (hex) последовательных блоков файла"""
+    with open(module_path, 'rb') as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            yield hashlib.sha256(chunk).hexdigest()
+
+
+def main():
+    """Главная функция"""
+    parser = argparse.ArgumentParser(description='Таблица контрольных сумм блоков модуля NVIDIA')
+    parser.add_argument('module', help='Пропатченный модуль (.ko)')
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_HASH_SIZE, help='Размер блока в байтах')
+    
+    args = parser.parse_args()
+    
+    try:
+        hashes = list(chunk_hashes(args.module, args.chunk_size))
+    except OSError as e:
+        print(f"Ошибка чтения модуля: {e}", file=sys.stderr)
+        sys.exit(1)
+    
+    # Фрагмент для вставки в запись версии в PATCH_SIGNATURES
+    print(f"        'chunk_size': {args.chunk_size},")
+    print("        'chunk_hashes': (")
+    for h in hashes:
+        print(f"            '{h}',")
+    print("        ),")
+
+if __name__ == '__main__':
+    main()
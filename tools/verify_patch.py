@@ -3,30 +3,143 @@
 Утилита для проверки применения патчей к драйверам NVIDIA
 """
 
+import io
 import os
+import re
 import sys
 import struct
 import hashlib
 import json
 import logging
+import mmap
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 from pathlib import Path
+from types import MappingProxyType
 from typing import Dict, List, Optional, Tuple
 
+# Простая эвристика для поиска секций: имена секций ELF
+SECTION_PATTERNS = (
+    b'.text',
+    b'.data',
+    b'.rodata',
+    b'.bss',
+    b'.symtab',
+    b'.strtab'
+)
+# Все имена одним регулярным выражением - один проход по файлу вместо шести
+_SECTION_RE = re.compile(b'|'.join(re.escape(pattern) for pattern in SECTION_PATTERNS))
+# Сколько байт конца блока нужно, чтобы найти имя на границе блоков
+_SECTION_OVERLAP = max(len(pattern) for pattern in SECTION_PATTERNS) - 1
+
+# Размер блока при потоковом анализе модулей
+ANALYZE_CHUNK_SIZE = 1 << 20
+# Байт начала файла для magic и ELF header (e_machine по смещению 18)
+HEADER_SIZE = 20
+
+# Сигнатуры патчей по версиям драйвера
+# Размер блока в таблице контрольных сумм модуля (chunk_hashes)
+CHUNK_HASH_SIZE = 2 << 20
+
+# Максимум потоков при проверке блоков одного модуля
+MAX_CHUNK_WORKERS = 4
+
+# chunk_hashes - SHA256 (hex) последовательных блоков по chunk_size байт
+# пропатченного модуля, генерируются tools/generate_chunk_hashes.py
+PATCH_SIGNATURES = MappingProxyType({
+    '535.274.02': {
+        'magic_bytes': b'NVPT\x01\x00\x00\x00',
+        'patch_offsets': [0x00123456, 0x00123ABC, 0x00123DEF],
+        'expected_changes': [
+            {'offset': 0x00123456, 'original': b'\x85\xC0', 'patched': b'\x90\x90'},
+            {'offset': 0x00123ABC, 'original': b'\x75\x0A', 'patched': b'\x31\xC0\xC3'},
+        ]
+    }
+})
+
+
+def _compile_signatures(signatures) -> MappingProxyType:
+    """Неизменяемые сигнатуры для проверки: кортеж magic и кортеж пар (смещение, патченые байты)
+    
+    magic_bytes - bytes либо список вариантов magic для одной версии.
+    """
+    return MappingProxyType({
+        version: MappingProxyType({
+            'magics': ((bytes(info['magic_bytes']),)
+                       if isinstance(info['magic_bytes'], (bytes, bytearray))
+                       else tuple(bytes(magic) for magic in info['magic_bytes'])),
+            'checks': tuple((change['offset'], bytes(change['patched']))
+                            for change in info.get('expected_changes', ())),
+            'chunk_size': info.get('chunk_size', CHUNK_HASH_SIZE),
+            'chunk_hashes': tuple(bytes.fromhex(h) if isinstance(h, str) else bytes(h)
+                                  for h in info.get('chunk_hashes', ()))
+        })
+        for version, info in signatures.items()
+    })
+
+
+_COMPILED_SIGNATURES = _compile_signatures(PATCH_SIGNATURES)
+
+# Шаблоны отчета generate_report
+REPORT_HEADER_TMPL = (
+    "=" * 60 + "\n"
+    "ОТЧЕТ О ПРОВЕРКЕ ПАТЧА NVIDIA ДРАЙВЕРА\n"
+    + "=" * 60 + "\n"
+    "\n"
+    "Версия драйвера: {driver_version}\n"
+    "Проверено модулей: {modules_checked}\n"
+    "Пропатчено модулей: {modules_patched}\n"
+    "Валидных модулей: {modules_valid}\n"
+    "Общий статус: {overall_status}\n"
+    "\n"
+    "ДЕТАЛИ ПО МОДУЛЯМ:\n"
+    + "-" * 40 + "\n"
+)
+REPORT_MODULE_TMPL = (
+    "{index}. {module_path}\n"
+    "   Существует: {exists}\n"
+    "   Пропатчен: {patched}\n"
+    "   Валиден: {valid}\n"
+)
+REPORT_SIZE_TMPL = "   Размер: {size} байт\n"
+REPORT_SHA256_TMPL = "   SHA256: {sha256_short}...\n"
+REPORT_ARCH_TMPL = "   Архитектура: {architecture}\n"
+REPORT_ERROR_TMPL = "     - {}\n"
+REPORT_FOOTER = "РЕКОМЕНДАЦИИ:\n" + "-" * 20
+# Рекомендации по общему статусу
+REPORT_RECOMMENDATIONS = MappingProxyType({
+    'fully_patched': "✓ Все модули успешно пропатчены и валидны",
+    'partially_patched': "⚠ Некоторые модули пропатчены, но есть проблемы\n"
+                         "  Рекомендуется повторить патчинг",
+    'not_patched': "✗ Модули не пропатчены\n"
+                   "  Необходимо применить патч",
+    'not_found': "✗ Модули NVIDIA не найдены\n"
+                 "  Убедитесь, что драйвер установлен",
+})
+
+def _fadvise(fd: int, *advices: str) -> None:
+    """Подсказки ядру о доступе к файлу (posix_fadvise есть не везде)"""
+    if not hasattr(os, 'posix_fadvise'):
+        return
+    for advice in advices:
+        try:
+            os.posix_fadvise(fd, 0, 0, getattr(os, advice))
+        except (OSError, AttributeError):
+            pass
+
 class PatchVerifier:
     """Класс для проверки патчей"""
     
-    def __init__(self):
+    patch_signatures = PATCH_SIGNATURES
+    
+    def __init__(self, hash_cache_file: str = "/var/cache/nvidia-patcher/hashes.json"):
         self.logger = self._setup_logging()
-        self.patch_signatures = {
-            '535.274.02': {
-                'magic_bytes': b'NVPT\x01\x00\x00\x00',
-                'patch_offsets': [0x00123456, 0x00123ABC, 0x00123DEF],
-                'expected_changes': [
-                    {'offset': 0x00123456, 'original': b'\x85\xC0', 'patched': b'\x90\x90'},
-                    {'offset': 0x00123ABC, 'original': b'\x75\x0A', 'patched': b'\x31\xC0\xC3'},
-                ]
-            }
-        }
+        # Кеш анализа модулей: путь -> размер, mtime_ns, хеш и детали; загружается при первом обращении
+        self.hash_cache_file = Path(hash_cache_file)
+        self._hash_cache = None
+        self._hash_cache_dirty = False
+        # Результат _find_nvidia_modules: версия ядра за время работы не меняется
+        self._module_paths = None
     
     def _setup_logging(self):
         """Настройка логирования"""
@@ -58,18 +171,32 @@ class PatchVerifier:
             # Проверка сигнатуры патча
             if self._check_patch_signature(module_path, driver_version):
                 result['patched'] = True
-                result['valid'] = True
-                self.logger.info(f"Модуль {module_path} успешно пропатчен")
+                result['valid'] = self._check_chunk_hashes(module_path, driver_version)
+                if result['valid']:
+                    self.logger.info(f"Модуль {module_path} успешно пропатчен")
+                else:
+                    result['errors'].append("Контрольные суммы блоков модуля не совпадают")
             else:
                 result['patched'] = False
                 self.logger.warning(f"Модуль {module_path} не пропатчен или патч поврежден")
             
+            # Все проходы по файлу завершены - не держим модуль в page cache
+            self._drop_page_cache(module_path)
+            
         except Exception as e:
             result['errors'].append(f"Ошибка проверки модуля: {e}")
             self.logger.error(f"Ошибка проверки {module_path}: {e}")
         
         return result
     
+    def _drop_page_cache(self, module_path: str) -> None:
+        """Освобождение страниц модуля в page cache после проверки"""
+        try:
+            with open(module_path, 'rb') as f:
+                _fadvise(f.fileno(), 'POSIX_FADV_DONTNEED')
+        except OSError as e:
+            self.logger.debug(f"Не удалось освободить кеш {module_path}: {e}")
+    
     def _analyze_module(self, module_path: str) -> Dict:
         """Анализ модуля"""
         details = {
@@ -85,67 +212,156 @@ class PatchVerifier:
             stat = os.stat(module_path)
             details['size'] = stat.st_size
             
-            # Контрольная сумма
+            # Файл не менялся с прошлой проверки - берем результат из кеша
+            cached = self._cached_details(module_path, stat)
+            if cached is not None:
+                details['sha256'] = cached['sha256']
+                details['magic'] = cached['magic']
+                details['architecture'] = cached['architecture']
+                details['sections'] = list(cached['sections'])
+                return details
+            
+            # Один последовательный проход блоками: хеш, заголовок и поиск секций
+            hasher = hashlib.sha256()
+            header = b''
+            found = set()
+            tail = b''
+            buf = bytearray(ANALYZE_CHUNK_SIZE)
+            view = memoryview(buf)
+            
             with open(module_path, 'rb') as f:
-                content = f.read()
-                details['sha256'] = hashlib.sha256(content).hexdigest()
+                # Ядро подчитывает следующие блоки, пока хешируется текущий.
+                # DONTNEED - в verify_module: страницы еще нужны проверкам патча
+                _fadvise(f.fileno(), 'POSIX_FADV_SEQUENTIAL', 'POSIX_FADV_WILLNEED')
+                while True:
+                    n = f.readinto(view)
+                    if not n:
+                        break
+                    chunk = view[:n]
+                    
+                    hasher.update(chunk)
+                    if len(header) < HEADER_SIZE:
+                        header += bytes(chunk[:HEADER_SIZE - len(header)])
+                    if len(found) < len(SECTION_PATTERNS):
+                        # Стык с предыдущим блоком, затем сам блок
+                        if tail:
+                            self._scan_sections(tail + bytes(chunk[:_SECTION_OVERLAP]), found)
+                        self._scan_sections(chunk, found)
+                        tail = bytes(chunk[-_SECTION_OVERLAP:])
+            
+            # Контрольная сумма
+            details['sha256'] = hasher.hexdigest()
             
             # Magic bytes
-            with open(module_path, 'rb') as f:
-                magic = f.read(16)
-                details['magic'] = magic.hex()
+            details['magic'] = header[:16].hex()
             
             # Архитектура (из ELF header)
-            if content.startswith(b'\x7fELF'):
+            if header.startswith(b'\x7fELF'):
                 # Упрощенный анализ ELF
-                details['architecture'] = 'x86_64' if struct.unpack('<H', content[18:20])[0] == 62 else 'x86'
+                details['architecture'] = 'x86_64' if struct.unpack('<H', header[18:20])[0] == 62 else 'x86'
+            
+            # Секции в порядке SECTION_PATTERNS
+            details['sections'] = [pattern.decode('ascii') for pattern in SECTION_PATTERNS if pattern in found]
             
-            # Поиск секций
-            details['sections'] = self._find_sections(content)
+            self._store_details(module_path, stat, details)
             
         except Exception as e:
             self.logger.error(f"Ошибка анализа модуля: {e}")
         
         return details
     
-    def _find_sections(self, content: bytes) -> List[str]:
-        """Поиск секций в модуле"""
-        sections = []
-        
-        # Простая эвристика для поиска секций
-        section_patterns = [
-            b'.text',
-            b'.data',
-            b'.rodata',
-            b'.bss',
-            b'.symtab',
-            b'.strtab'
-        ]
+    def _load_hash_cache(self) -> Dict:
+        """Загрузка кеша контрольных сумм (пустой при отсутствии или повреждении)"""
+        if self._hash_cache is None:
+            try:
+                with open(self.hash_cache_file, 'r', encoding='utf-8') as f:
+                    self._hash_cache = json.load(f)
+            except FileNotFoundError:
+                self._hash_cache = {}
+            except (OSError, ValueError) as e:
+                self.logger.debug(f"Кеш хешей не загружен: {e}")
+                self._hash_cache = {}
+        return self._hash_cache
+    
+    def _cached_details(self, module_path: str, stat: os.stat_result) -> Optional[Dict]:
+        """Запись кеша модуля, если размер и mtime файла не изменились"""
+        entry = self._load_hash_cache().get(module_path)
+        # Запись без полного набора полей считается промахом
+        if (entry and entry.get('size') == stat.st_size and entry.get('mtime_ns') == stat.st_mtime_ns
+                and 'sections' in entry):
+            return entry
+        return None
+    
+    def _store_details(self, module_path: str, stat: os.stat_result, details: Dict):
+        """Запись результата анализа модуля в кеш (сохраняется в save_hash_cache)"""
+        self._load_hash_cache()[module_path] = {
+            'size': stat.st_size,
+            'mtime_ns': stat.st_mtime_ns,
+            'sha256': details['sha256'],
+            'magic': details['magic'],
+            'architecture': details['architecture'],
+            'sections': details['sections']
+        }
+        self._hash_cache_dirty = True
+    
+    def save_hash_cache(self):
+        """Атомарное сохранение кеша контрольных сумм
         
-        for pattern in section_patterns:
-            if pattern in content:
-                sections.append(pattern.decode('ascii'))
+        Без прав на запись в каталог кеша (запуск не от root) кеш не сохраняется.
+        """
+        if not self._hash_cache_dirty:
+            return
         
-        return sections
+        tmp_file = self.hash_cache_file.with_name(self.hash_cache_file.name + '.tmp')
+        try:
+            self.hash_cache_file.parent.mkdir(parents=True, exist_ok=True)
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                json.dump(self._hash_cache, f)
+            os.replace(tmp_file, self.hash_cache_file)
+            self._hash_cache_dirty = False
+        except OSError as e:
+            self.logger.debug(f"Кеш хешей не сохранен: {e}")
+    
+    def _scan_sections(self, data, found: set):
+        """Добавление в found имен секций, встретившихся в data"""
+        for match in _SECTION_RE.finditer(data):
+            found.add(match.group())
+            if len(found) == len(SECTION_PATTERNS):
+                break  # все секции уже найдены
     
     def _check_patch_signature(self, module_path: str, driver_version: str) -> bool:
         """Проверка сигнатуры патча"""
         try:
-            with open(module_path, 'rb') as f:
-                content = f.read()
-            
-            # Проверка magic bytes патча
-            signature_info = self.patch_signatures.get(driver_version)
+            # Сигнатура патча для версии драйвера
+            signature_info = _COMPILED_SIGNATURES.get(driver_version)
             if not signature_info:
                 self.logger.warning(f"Информация о патче для версии {driver_version} не найдена")
                 return False
             
-            # Поиск magic bytes
-            if signature_info['magic_bytes'] in content:
-                self.logger.info(f"Magic bytes патча найдены в {module_path}")
+            # Файл отображается в память: читаются только нужные страницы,
+            # без копии всего модуля
+            with open(module_path, 'rb') as f:
+                if os.fstat(f.fileno()).st_size == 0:
+                    return False
                 
-                # Дополнительная проверка патчей
-                return self._verify_patch_details(content, signature_info)
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    checks = signature_info['checks']
+                    if checks:
+                        # Сначала байты в местах патча: это несколько страниц
+                        # вместо прохода по всему файлу в поисках magic
+                        if hasattr(mmap, 'MADV_RANDOM'):  # Python 3.8+, не на всех платформах
+                            mm.madvise(mmap.MADV_RANDOM)
+                        if self._verify_patch_details(mm, checks):
+                            self.logger.info(f"Патченые байты найдены в {module_path}")
+                            return True
+                        return False
+                    
+                    # Смещения для версии не заданы - проверяем только magic bytes:
+                    # mmap.find идет через memmem из libc, по проходу на вариант
+                    for magic in signature_info['magics']:
+                        if mm.find(magic) != -1:
+                            self.logger.info(f"Magic bytes патча найдены в {module_path}")
+                            return True
             
             return False
             
@@ -153,22 +369,72 @@ class PatchVerifier:
             self.logger.error(f"Ошибка проверки сигнатуры: {e}")
             return False
     
-    def _verify_patch_details(self, content: bytes, signature_info: Dict) -> bool:
-        """Детальная проверка патча"""
+    def _check_chunk_hashes(self, module_path: str, driver_version: str) -> bool:
+        """Проверка модуля по таблице контрольных сумм блоков (True, если таблицы нет)"""
+        signature_info = _COMPILED_SIGNATURES.get(driver_version)
+        if not signature_info or not signature_info['chunk_hashes']:
+            return True
+        
         try:
-            for change in signature_info.get('expected_changes', []):
-                offset = change['offset']
-                original = change['original']
-                patched = change['patched']
+            with open(module_path, 'rb') as f:
+                size = os.fstat(f.fileno()).st_size
+                chunk_size = signature_info['chunk_size']
+                if (size + chunk_size - 1) // chunk_size != len(signature_info['chunk_hashes']):
+                    self.logger.warning(f"Размер {module_path} не соответствует таблице блоков")
+                    return False
                 
-                # Проверка, что оригинальные байты заменены на патченые
-                if offset + len(patched) <= len(content):
-                    current_bytes = content[offset:offset + len(patched)]
-                    if current_bytes != patched:
-                        self.logger.warning(f"Патч не применен по смещению {offset}")
-                        return False
-                else:
-                    self.logger.warning(f"Смещение {offset} выходит за пределы файла")
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    return self._verify_chunks(mm, signature_info)
+                
+        except Exception as e:
+            self.logger.error(f"Ошибка проверки блоков модуля: {e}")
+            return False
+    
+    def _verify_chunks(self, mm, signature_info) -> bool:
+        """Параллельная проверка блоков с выходом на первом несовпадении
+        
+        Потоки, а не процессы: sha256 отпускает GIL на больших буферах,
+        а mmap не передается в другой процесс.
+        """
+        chunk_size = signature_info['chunk_size']
+        expected = signature_info['chunk_hashes']
+        mismatch = threading.Event()
+        
+        def chunk_ok(index: int) -> Optional[bool]:
+            if mismatch.is_set():
+                return None  # несовпадение уже найдено, блок не проверяется
+            start = index * chunk_size
+            ok = hashlib.sha256(mm[start:start + chunk_size]).digest() == expected[index]
+            if not ok:
+                mismatch.set()
+            return ok
+        
+        with ThreadPoolExecutor(max_workers=min(MAX_CHUNK_WORKERS, len(expected))) as executor:
+            futures = {executor.submit(chunk_ok, i): i for i in range(len(expected))}
+            for future in as_completed(futures):
+                if future.result() is False:
+                    for pending in futures:
+                        pending.cancel()
+                    self.logger.warning(f"Блок {futures[future]} модуля не совпадает с таблицей")
+                    return False
+        
+        return True
+    
+    def _verify_patch_details(self, content, checks: Tuple[Tuple[int, bytes], ...]) -> bool:
+        """Детальная проверка патча (content - bytes или mmap)"""
+        try:
+            size = len(content)
+            for offset, patched in checks:
+                end = offset + len(patched)
+                
+                # Проверка, что оригинальные байты заменены на патченые.
+                # Для непропатченных модулей (nvidia-drm, nvidia-uvm и т.п.) это
+                # обычный исход - итог по модулю пишет verify_module
+                if end > size:
+                    self.logger.debug(f"Смещение {offset} выходит за пределы файла")
+                    return False
+                if content[offset:end] != patched:
+                    self.logger.debug(f"Патч не применен по смещению {offset}")
                     return False
             
             return True
@@ -191,44 +457,68 @@ class PatchVerifier:
         # Поиск модулей NVIDIA
         module_paths = self._find_nvidia_modules()
         
-        for module_path in module_paths:
-            module_result = self.verify_module(module_path, driver_version)
-            result['modules'].append(module_result)
-            result['modules_checked'] += 1
-            
-            if module_result['patched']:
-                result['modules_patched'] += 1
-            
-            if module_result['valid']:
-                result['modules_valid'] += 1
+        modules = self._verify_modules(module_paths, driver_version)
+        checked = len(modules)
+        patched = sum(1 for module_result in modules if module_result['patched'])
+        valid = sum(1 for module_result in modules if module_result['valid'])
+        result.update(modules=modules, modules_checked=checked,
+                      modules_patched=patched, modules_valid=valid)
+        
+        self.save_hash_cache()
         
         # Определение общего статуса
-        if result['modules_checked'] == 0:
+        if checked == 0:
             result['overall_status'] = 'not_found'
-        elif result['modules_valid'] == result['modules_checked']:
+        elif valid == checked:
             result['overall_status'] = 'fully_patched'
-        elif result['modules_patched'] > 0:
+        elif patched > 0:
             result['overall_status'] = 'partially_patched'
         else:
             result['overall_status'] = 'not_patched'
         
         return result
     
-    def _find_nvidia_modules(self) -> List[str]:
-        """Поиск модулей NVIDIA"""
-        module_paths = []
+    def _verify_modules(self, module_paths: List[str], driver_version: str) -> List[Dict]:
+        """Проверка модулей в пуле процессов (хеширование упирается в CPU)
+        
+        Воркеры получают из кеша только запись своего модуля и возвращают
+        новую запись; кеш на диск сохраняет родительский процесс.
+        """
+        if len(module_paths) < 2:
+            return [self.verify_module(path, driver_version) for path in module_paths]
+        
+        cache = self._load_hash_cache()
+        tasks = [(path, driver_version, cache.get(path)) for path in module_paths]
+        try:
+            with ProcessPoolExecutor(max_workers=min(len(tasks), os.cpu_count() or 1)) as executor:
+                outputs = list(executor.map(_verify_module_worker, tasks))
+        except (OSError, RuntimeError) as e:
+            # Например, нет /dev/shm для семафоров multiprocessing
+            self.logger.warning(f"Пул процессов недоступен, последовательная проверка: {e}")
+            return [self.verify_module(path, driver_version) for path in module_paths]
+        
+        results = []
+        for path, (module_result, cache_entry) in zip(module_paths, outputs):
+            if cache_entry is not None:
+                cache[path] = cache_entry
+                self._hash_cache_dirty = True
+            results.append(module_result)
+        return results
+    
+    def _find_nvidia_modules(self, refresh: bool = False) -> List[str]:
+        """Поиск модулей NVIDIA (результат кешируется, refresh=True - искать заново)"""
+        if self._module_paths is not None and not refresh:
+            return list(self._module_paths)
+        
+        module_paths = set()
         search_paths = [
             '/lib/modules/',
             '/usr/lib/x86_64-linux-gnu/',
             '/usr/lib64/'
         ]
         
-        # Текущее ядро
-        import subprocess
-        try:
-            kernel_release = subprocess.check_output(['uname', '-r'], text=True).strip()
-        except:
-            kernel_release = ""
+        # Текущее ядро (uname(2) без запуска процесса)
+        kernel_release = os.uname().release
         
         # Поиск модулей
         for base_path in search_paths:
@@ -237,83 +527,41 @@ class PatchVerifier:
             else:
                 search_path = base_path
             
-            try:
-                for root, dirs, files in os.walk(search_path):
-                    for file in files:
-                        if file.startswith('nvidia') and file.endswith('.ko'):
-                            full_path = os.path.join(root, file)
-                            if os.path.exists(full_path):
-                                module_paths.append(full_path)
-            except (PermissionError, OSError):
-                continue
-        
-        # Поиск в текущей директории проекта
+            module_paths.update(self._walk_modules(search_path))
+        
+        # Поиск в текущей директории проекта (glob по отсутствующему каталогу пуст)
         project_modules = Path(__file__).parent.parent / "modules"
-        if project_modules.exists():
-            for module_file in project_modules.glob("nvidia*.ko"):
-                module_paths.append(str(module_file))
+        module_paths.update(str(module_file) for module_file in project_modules.glob("nvidia*.ko"))
+        
+        self._module_paths = list(module_paths)
+        return list(self._module_paths)
+    
+    @classmethod
+    def _walk_modules(cls, path: str):
+        """Рекурсивный обход каталога с отбором nvidia*.ko по имени.
         
-        return list(set(module_paths))  # Удаление дубликатов
+        Имя проверяется до любых stat(), тип записи берется из d_type
+        (DirEntry); недоступные каталоги пропускаются, как в os.walk.
+        """
+        try:
+            with os.scandir(path) as it:
+                for entry in it:
+                    try:
+                        is_dir = entry.is_dir(follow_symlinks=False)
+                    except OSError:
+                        continue
+                    if is_dir:
+                        yield from cls._walk_modules(entry.path)
+                    elif entry.name.startswith('nvidia') and entry.name.endswith('.ko'):
+                        yield entry.path
+        except OSError:
+            return
     
     def generate_report(self, verification_result: Dict, output_file: Optional[str] = None) -> str:
         """Генерация отчета о проверке"""
-        report = []
-        report.append("=" * 60)
-        report.append("ОТЧЕТ О ПРОВЕРКЕ ПАТЧА NVIDIA ДРАЙВЕРА")
-        report.append("=" * 60)
-        report.append("")
-        
-        # Общая информация
-        report.append(f"Версия драйвера: {verification_result['driver_version']}")
-        report.append(f"Проверено модулей: {verification_result['modules_checked']}")
-        report.append(f"Пропатчено модулей: {verification_result['modules_patched']}")
-        report.append(f"Валидных модулей: {verification_result['modules_valid']}")
-        report.append(f"Общий статус: {verification_result['overall_status']}")
-        report.append("")
-        
-        # Детальная информация по модулям
-        report.append("ДЕТАЛИ ПО МОДУЛЯМ:")
-        report.append("-" * 40)
-        
-        for i, module in enumerate(verification_result['modules'], 1):
-            report.append(f"{i}. {module['module_path']}")
-            report.append(f"   Существует: {'Да' if module['exists'] else 'Нет'}")
-            report.append(f"   Пропатчен: {'Да' if module['patched'] else 'Нет'}")
-            report.append(f"   Валиден: {'Да' if module['valid'] else 'Нет'}")
-            
-            if module['details']:
-                details = module['details']
-                report.append(f"   Размер: {details.get('size', 0)} байт")
-                if details.get('sha256'):
-                    report.append(f"   SHA256: {details['sha256'][:16]}...")
-                if details.get('architecture'):
-                    report.append(f"   Архитектура: {details['architecture']}")
-            
-            if module['errors']:
-                report.append("   Ошибки:")
-                for error in module['errors']:
-                    report.append(f"     - {error}")
-            
-            report.append("")
-        
-        # Рекомендации
-        report.append("РЕКОМЕНДАЦИИ:")
-        report.append("-" * 20)
-        
-        status = verification_result['overall_status']
-        if status == 'fully_patched':
-            report.append("✓ Все модули успешно пропатчены и валидны")
-        elif status == 'partially_patched':
-            report.append("⚠ Некоторые модули пропатчены, но есть проблемы")
-            report.append("  Рекомендуется повторить патчинг")
-        elif status == 'not_patched':
-            report.append("✗ Модули не пропатчены")
-            report.append("  Необходимо применить патч")
-        elif status == 'not_found':
-            report.append("✗ Модули NVIDIA не найдены")
-            report.append("  Убедитесь, что драйвер установлен")
-        
-        report_text = "\n".join(report)
+        buf = io.StringIO()
+        self.write_report(verification_result, buf)
+        report_text = buf.getvalue()
         
         # Сохранение в файл
         if output_file:
@@ -325,6 +573,89 @@ class PatchVerifier:
                 self.logger.error(f"Ошибка сохранения отчета: {e}")
         
         return report_text
+    
+    def write_report(self, verification_result: Dict, fp) -> None:
+        """Запись отчета в текстовый поток по частям, без сборки всего текста в памяти"""
+        # Для отчета по одному модулю (--module) сводных полей нет
+        fp.write(REPORT_HEADER_TMPL.format(
+            driver_version=verification_result.get('driver_version', ''),
+            modules_checked=verification_result.get('modules_checked', len(verification_result['modules'])),
+            modules_patched=verification_result.get('modules_patched', ''),
+            modules_valid=verification_result.get('modules_valid', ''),
+            overall_status=verification_result['overall_status']
+        ))
+        
+        # Детальная информация по модулям
+        for i, module in enumerate(verification_result['modules'], 1):
+            fp.write(self._format_module(i, module))
+        
+        # Рекомендации
+        fp.write(REPORT_FOOTER)
+        recommendation = REPORT_RECOMMENDATIONS.get(verification_result['overall_status'])
+        if recommendation:
+            fp.write("\n" + recommendation)
+    
+    def save_report(self, verification_result: Dict, output_file: str, as_json: bool = False) -> bool:
+        """Потоковое сохранение отчета (текст или JSON) в файл"""
+        try:
+            with open(output_file, 'w', encoding='utf-8') as f:
+                if as_json:
+                    json.dump(verification_result, f, indent=2, ensure_ascii=False)
+                else:
+                    self.write_report(verification_result, f)
+            self.logger.info(f"Отчет сохранен в: {output_file}")
+            return True
+        except Exception as e:
+            self.logger.error(f"Ошибка сохранения отчета: {e}")
+            return False
+    
+    def _format_module(self, index: int, module: Dict) -> str:
+        """Блок отчета по одному модулю"""
+        parts = [REPORT_MODULE_TMPL.format(
+            index=index,
+            module_path=module['module_path'],
+            exists='Да' if module['exists'] else 'Нет',
+            patched='Да' if module['patched'] else 'Нет',
+            valid='Да' if module['valid'] else 'Нет'
+        )]
+        
+        details = module['details']
+        if details:
+            parts.append(REPORT_SIZE_TMPL.format(size=details.get('size', 0)))
+            if details.get('sha256'):
+                parts.append(REPORT_SHA256_TMPL.format(sha256_short=details['sha256'][:16]))
+            if details.get('architecture'):
+                parts.append(REPORT_ARCH_TMPL.format(architecture=details['architecture']))
+        
+        if module['errors']:
+            parts.append("   Ошибки:\n")
+            parts.extend(REPORT_ERROR_TMPL.format(error) for error in module['errors'])
+        
+        parts.append("\n")
+        return ''.join(parts)
+
+# Проверяющий в процессе-воркере пула; создается при первой задаче
+_worker_verifier = None
+
+
+def _verify_module_worker(task: Tuple[str, str, Optional[Dict]]) -> Tuple[Dict, Optional[Dict]]:
+    """Проверка одного модуля в процессе пула
+    
+    task - (путь, версия драйвера, запись кеша хешей или None). Возвращает
+    результат verify_module и новую запись кеша, если хеш был пересчитан.
+    """
+    global _worker_verifier
+    if _worker_verifier is None:
+        _worker_verifier = PatchVerifier()
+    
+    module_path, driver_version, cache_entry = task
+    # Кеш воркера содержит только запись проверяемого модуля
+    _worker_verifier._hash_cache = {module_path: cache_entry} if cache_entry else {}
+    _worker_verifier._hash_cache_dirty = False
+    
+    result = _worker_verifier.verify_module(module_path, driver_version)
+    new_entry = _worker_verifier._hash_cache.get(module_path) if _worker_verifier._hash_cache_dirty else None
+    return result, new_entry
 
 def main():
     """Главная функция"""
@@ -346,23 +677,27 @@ def main():
     
     if args.module:
         # Проверка конкретного модуля
-        result = verifier.verify_module(args.module, args.version)
-        
+        module_result = verifier.verify_module(args.module, args.version)
+        verifier.save_hash_cache()
+        # В JSON выводится сам результат модуля, в текстовом отчете - список из него
         if args.json:
-            print(json.dumps(result, indent=2, ensure_ascii=False))
+            result = module_result
         else:
-            report = verifier.generate_report({'modules': [result], 'overall_status': 'custom'})
-            print(report)
+            result = {'modules': [module_result], 'overall_status': 'custom'}
     
     else:
         # Полная проверка драйвера
         result = verifier.verify_driver_installation(args.version)
-        
-        if args.json:
-            print(json.dumps(result, indent=2, ensure_ascii=False))
-        else:
-            report = verifier.generate_report(result, args.output)
-            print(report)
+    
+    # Отчет пишется в поток по частям, а не собирается целиком перед выводом
+    if args.output:
+        verifier.save_report(result, args.output, as_json=args.json)
+    
+    if args.json:
+        json.dump(result, sys.stdout, indent=2, ensure_ascii=False)
+    else:
+        verifier.write_report(result, sys.stdout)
+    sys.stdout.write("\n")
 
 if __name__ == '__main__':
     main()
\ No newline at end of file